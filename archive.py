@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Título: Archivo Parquet particionado de la tabla 'metricas'
+
+"""
+Este módulo contiene el archivo a largo plazo de las filas crudas de
+'metricas'. Antes de que la retención (ver maintenance.py) borre las filas
+antiguas de la tabla, el mantenimiento las exporta a archivos Parquet
+particionados al estilo Hive en un directorio junto a 'monitoreo.duckdb':
+
+    data/metricas_archivo/year=2026/month=3/host=mi-equipo/metricas_<uuid>.parquet
+
+El archivo .duckdb se mantiene pequeño y rápido, y los meses archivados se
+siguen pudiendo consultar: cada conexión de lectura crea la vista temporal
+'metricas_historico', que une (UNION ALL) la tabla viva con read_parquet sobre
+el archivo. Las consultas que filtran por año y mes (ver
+archive_partition_filter) solo abren los archivos de las particiones afectadas.
+"""
+
+import glob
+import os
+
+import duckdb
+
+# Vista temporal que une la tabla viva y el archivo Parquet
+ARCHIVE_VIEW = "metricas_historico"
+
+# Tipos de las columnas de partición que añade hive_partitioning
+HIVE_TYPES = "{'year': BIGINT, 'month': BIGINT, 'host': VARCHAR}"
+
+
+class ArchiveError(Exception):
+    """
+    Error al exportar filas al archivo Parquet (disco lleno, permisos, ruta no válida).
+    Se distingue de duckdb.IOException, que el recolector trata como bloqueo del archivo.
+    """
+
+
+def sql_literal(text):
+    """Escapa un texto para incluirlo entre comillas simples en SQL (rutas de archivo)."""
+    return text.replace("'", "''")
+
+
+def archive_path(db_path):
+    """Devuelve el directorio del archivo Parquet asociado a un archivo .duckdb."""
+    return os.path.join(os.path.dirname(db_path) or ".", "metricas_archivo")
+
+
+def archive_glob(archive_dir):
+    """Devuelve el patrón de los archivos Parquet del archivo, o None si todavía no hay ninguno."""
+    pattern = os.path.join(archive_dir, "year=*", "month=*", "host=*", "*.parquet")
+    if not glob.glob(pattern):
+        return None
+    return pattern
+
+
+def export_archive(conn, archive_dir, before):
+    """
+    Añade al archivo Parquet las filas de 'metricas' anteriores a 'before'. No las
+    borra: de eso se encarga la retención, justo después y con el mismo límite.
+
+    :param conn: Conexión DuckDB de lectura/escritura.
+    :param archive_dir: Directorio del archivo.
+    :param before: Instante límite (las filas con marca de tiempo anterior se exportan).
+    :return: Número de filas exportadas.
+    :raises ArchiveError: Si la exportación falla.
+    """
+    # Las columnas de partición solo forman parte de la ruta: en el Parquet queda la fila tal cual
+    try:
+        result = conn.execute(f"""
+            COPY (
+                SELECT *, year(timestamp) AS year, month(timestamp) AS month, hostname AS host
+                FROM metricas
+                WHERE timestamp < ?
+            ) TO '{sql_literal(archive_dir)}'
+            (FORMAT parquet, PARTITION_BY (year, month, host), APPEND, FILENAME_PATTERN 'metricas_{{uuid}}')
+        """, [before]).fetchone()
+    except (duckdb.Error, OSError) as e:
+        raise ArchiveError(f"No se pudieron exportar las filas a '{archive_dir}': {e}") from e
+    return result[0] if result else 0
+
+
+def create_archive_view(conn, archive_dir):
+    """
+    Crea en la conexión la vista temporal ARCHIVE_VIEW. Si el archivo aún está
+    vacío, la vista solo cubre la tabla viva. Se pensó para el parámetro
+    on_connect de ReadOnlyConnectionManager, de modo que cada conexión nueva ve
+    los archivos exportados desde la anterior.
+
+    :param conn: Conexión DuckDB (puede ser de solo lectura).
+    :param archive_dir: Directorio del archivo.
+    """
+    # El CAST no cuesta nada sobre la columna TIMESTAMP y admite tablas aún no migradas
+    query = ("SELECT *, year(CAST(timestamp AS TIMESTAMP)) AS year, "
+             "month(CAST(timestamp AS TIMESTAMP)) AS month FROM metricas")
+    pattern = archive_glob(archive_dir)
+    if pattern is not None:
+        query += f"""
+            UNION ALL BY NAME
+            SELECT * EXCLUDE (host)
+            FROM read_parquet('{sql_literal(pattern)}', hive_partitioning = true, hive_types = {HIVE_TYPES})
+        """
+    try:
+        conn.execute(f"CREATE OR REPLACE TEMP VIEW {ARCHIVE_VIEW} AS {query}")
+    except duckdb.CatalogException:
+        # Sin tabla 'metricas' todavía no hay nada que unir; las consultas informarán del error
+        pass
+
+
+def archive_partition_filter(since):
+    """
+    Devuelve un filtro sobre las columnas de partición equivalente a 'timestamp >= since'
+    a nivel de mes, con el que DuckDB descarta las particiones anteriores sin abrirlas.
+
+    :return: Tupla (condición SQL, parámetros).
+    """
+    return "(year > ? OR (year = ? AND month >= ?))", [since.year, since.year, since.month]
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Título: Tabla de procesos sintética para las pruebas de rendimiento
+
+"""
+Este módulo sustituye, durante una prueba, la lista de procesos de psutil por
+una tabla de procesos sintética de tamaño fijo. Así el coste del muestreador y
+del Top 10 de CPU se mide igual en cualquier equipo, sin depender de los
+procesos que haya en marcha.
+
+Para comparar las dos formas de leer los procesos en Linux (psutil y /proc),
+spawn_process_tree arranca además un árbol real de procesos dormidos.
+"""
+
+import contextlib
+import os
+import random
+import signal
+import subprocess
+import time
+from collections import namedtuple
+
+import process_monitor
+
+# Nombres de proceso de la tabla sintética (varios procesos comparten nombre, como en un navegador)
+PROCESS_NAMES = ("chrome", "python", "code", "explorer", "svchost", "slack", "duckdb",
+                 "postgres", "java", "node", "teams", "outlook", "dwm", "searchindexer")
+
+
+FakeMemoryInfo = namedtuple("FakeMemoryInfo", "rss vms")
+FakeIOCounters = namedtuple("FakeIOCounters", "read_count write_count read_bytes write_bytes")
+FakeCPUTimes = namedtuple("FakeCPUTimes", "user system")
+
+
+class FakeProcess:
+    """
+    Proceso sintético con la parte de la interfaz de psutil.Process que usa el
+    muestreador: as_dict(attrs) sobre todos los atributos del proceso ('attributes')
+    y create_time().
+    """
+
+    def __init__(self, pid, ppid, name, cpu_percent, rss, read_bytes, write_bytes, threads):
+        self.pid = pid
+        self.attributes = {
+            'pid': pid,
+            'ppid': ppid,
+            'name': name,
+            'cpu_percent': cpu_percent,
+            'cpu_times': FakeCPUTimes(cpu_percent * 10, cpu_percent),
+            'memory_info': FakeMemoryInfo(rss, rss * 2),
+            'io_counters': FakeIOCounters(0, 0, read_bytes, write_bytes),
+            'num_threads': threads,
+            'num_handles': threads * 20,
+        }
+
+    def as_dict(self, attrs=None, ad_value=None):
+        # Como psutil, solo se devuelven los atributos pedidos
+        return {name: self.attributes[name] for name in attrs}
+
+    def create_time(self):
+        return 0.0
+
+
+def fake_process_table(count, seed=0):
+    """
+    Crea una tabla de 'count' procesos con nombres repetidos y consumos aleatorios
+    (un tercio de ellos ociosos, con 0 % de CPU). Cada proceso cuelga de init o, la
+    mitad de las veces, de un proceso anterior, de modo que forman árboles.
+    """
+    rng = random.Random(seed)
+    processes = []
+    for pid in range(1, count + 1):
+        name = f"{rng.choice(PROCESS_NAMES)}{rng.randrange(count // 10 + 1)}"
+        cpu = 0.0 if rng.random() < 0.33 else rng.random() * 25
+        ppid = rng.randrange(1, pid) if pid > 1 and rng.random() < 0.5 else 1
+        processes.append(FakeProcess(pid, ppid, name, cpu, rng.randrange(1, 2_000_000_000),
+                                     rng.randrange(10 ** 9), rng.randrange(10 ** 9), rng.randrange(1, 64)))
+    return processes
+
+
+@contextlib.contextmanager
+def patched_process_table(processes):
+    """
+    Hace que psutil.pids y psutil.Process devuelvan la tabla sintética dentro del
+    bloque. El muestreador debe crearse antes (comprueba los atributos de psutil.Process).
+    """
+    by_pid = {process.pid: process for process in processes}
+    psutil = process_monitor.psutil
+    original = psutil.pids, psutil.Process
+    psutil.pids = lambda: list(by_pid)
+    psutil.Process = by_pid.__getitem__
+    try:
+        yield
+    finally:
+        psutil.pids, psutil.Process = original
+
+
+@contextlib.contextmanager
+def spawn_process_tree(count, children_per_parent=50, timeout=30.0):
+    """
+    Arranca un árbol real de unos 'count' procesos dormidos: intérpretes sh que a su
+    vez lanzan 'children_per_parent - 1' procesos sleep cada uno. Al salir del
+    bloque se terminan todos (cada sh encabeza su propio grupo de procesos).
+
+    :return: Lista de los procesos sh (subprocess.Popen).
+    """
+    script = f"for i in $(seq {children_per_parent - 1}); do sleep 600 & done; wait"
+    parents = []
+    try:
+        for _ in range(max(1, count // children_per_parent)):
+            parents.append(subprocess.Popen(["sh", "-c", script], start_new_session=True))
+        # Se espera a que todos los hijos existan antes de medir
+        expected = len(parents) * children_per_parent
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            parent_pids = {str(parent.pid) for parent in parents}
+            started = len(parents)
+            for entry in os.listdir("/proc"):
+                if entry.isdigit():
+                    try:
+                        with open(f"/proc/{entry}/stat", "rb") as f:
+                            stat = f.read()
+                    except OSError:
+                        continue
+                    if stat[stat.rfind(b")") + 2:].split()[1].decode() in parent_pids:
+                        started += 1
+            if started >= expected:
+                break
+            time.sleep(0.1)
+        yield parents
+    finally:
+        for parent in parents:
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(parent.pid, signal.SIGTERM)
+        for parent in parents:
+            parent.wait()
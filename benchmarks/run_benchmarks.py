@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+# Título: Pruebas de rendimiento del arranque y de la latencia de cada comando
+
+"""
+Este script mide el arranque de la aplicación y la latencia de las rutas
+calientes del chat sobre bases de datos sintéticas (synthetic_db.py) de
+10 mil, 1 millón o 50 millones de filas, y escribe los resultados en JSON para
+poder compararlos entre versiones:
+
+    python benchmarks/run_benchmarks.py --sizes 10k,1m --output resultados.json
+    python benchmarks/run_benchmarks.py --baseline resultados.json   # sale con 1 si hay regresiones
+
+Se mide:
+- startup: arranque de la ventana con --profile-startup (primera pintura y motor
+  listo) y del modo --cli, como procesos nuevos;
+- _duckdb_execute: la consulta del último registro, sin cachés;
+- format: leer y formatear 100 mil valores de una métrica, valor a valor en Python
+  (safe_format) o por columnas en DuckDB (format_sql);
+- get_metrics_data: con la caché vacía (consulta completa) y con la caché válida;
+- top_processes: una pasada del muestreador, get_top_cpu_processes y la agrupación
+  por aplicación (árbol de procesos) sobre una tabla de procesos sintética
+  (fake_processes.py);
+- proc: en Linux, una pasada del muestreador leyendo /proc (proc_reader.py) frente
+  a la misma pasada con psutil, con un árbol real de 2000 procesos en marcha;
+- handle_input: el camino completo de la ventana en Qt sin pantalla
+  (QT_QPA_PLATFORM=offscreen), desde la entrada hasta pintar la burbuja.
+
+Las bases de datos se guardan en --workdir y se reutilizan entre ejecuciones.
+Sus marcas de tiempo terminan en el momento en que se generaron: para que el
+historial de la última hora mida lo mismo que en un equipo en uso, conviene
+regenerarlas (--regenerate) si son de otro día.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import duckdb  # noqa: E402
+
+from command_engine import CommandEngine, format_sql, safe_format  # noqa: E402
+from fake_processes import fake_process_table, patched_process_table, spawn_process_tree  # noqa: E402
+from process_monitor import TopProcessSampler, aggregate, application_roots  # noqa: E402
+import proc_reader  # noqa: E402
+from synthetic_db import ensure_metricas_db, generate_metricas_db, parse_size  # noqa: E402
+
+# Consulta del último registro, la misma que usa get_metrics_data sin host
+LATEST_ROW_QUERY = ("SELECT * FROM metricas WHERE timestamp = "
+                    "(SELECT max(timestamp) FROM metricas) LIMIT 1")
+
+# Filas que se formatean en la comparación safe_format (Python) / format_sql (DuckDB)
+FORMAT_ROWS = 100_000
+
+# Procesos de la tabla sintética y del árbol real de la comparación psutil / /proc
+FAKE_PROCESS_COUNT = 2000
+PROCESS_TREE_SIZE = 2000
+
+# Comandos del chat que se miden en el camino completo de la ventana
+HANDLE_INPUT_COMMANDS = ("cpu_percent", "opciones", "cpu_percent 1h", "top_10_cpu")
+
+# Hitos del informe de --profile-startup: "    57.5 ms  ventana creada"
+PROFILE_MARK_PATTERN = re.compile(r"^\s+(?P<ms>\d+(?:\.\d+)?) ms  (?P<label>.+)$")
+
+
+def summarize(name, dataset, samples_ms):
+    """Resume una lista de duraciones (ms) en un resultado de la salida JSON."""
+    ordered = sorted(samples_ms)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        'name': name,
+        'dataset': dataset,
+        'iterations': len(ordered),
+        'min_ms': round(ordered[0], 4),
+        'median_ms': round(statistics.median(ordered), 4),
+        'p95_ms': round(ordered[p95_index], 4),
+        'mean_ms': round(statistics.fmean(ordered), 4),
+    }
+
+
+def measure(fn, iterations, warmup=3, setup=None):
+    """
+    Llama a fn 'iterations' veces (tras 'warmup' llamadas sin medir) y devuelve las
+    duraciones en ms. 'setup', si se indica, se llama antes de cada llamada, fuera de la medida.
+    """
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        fn()
+    samples = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def bench_engine(db_path, dataset, iterations):
+    """Mide las consultas del motor de comandos sobre una base de datos."""
+    results = []
+    engine = CommandEngine(db_path)
+    try:
+        # Se quita la pausa de liberación para medir la consulta y no la ventana de cesión del bloqueo
+        engine.db_reader.release_window_seconds = 0.0
+
+        def check(value):
+            if isinstance(value, dict) and 'error' in value:
+                raise RuntimeError(value['error'])
+            return value
+
+        results.append(summarize("_duckdb_execute", dataset, measure(
+            lambda: check(engine._duckdb_execute(LATEST_ROW_QUERY, with_columns=True)), iterations)))
+        results.append(summarize("get_metrics_data.cold", dataset, measure(
+            lambda: check(engine.get_metrics_data()), iterations, setup=engine.metrics_caches.clear)))
+        results.append(summarize("get_metrics_data.cached", dataset, measure(
+            lambda: check(engine.get_metrics_data()), iterations)))
+        results.append(summarize("get_metric_history.1h", dataset, measure(
+            lambda: engine.get_metric_history('cpu_percent', 3600, '1h'), iterations)))
+
+        raw_query = "SELECT red_bytes_sent FROM metricas LIMIT ?"
+        formatted_query = f"SELECT {format_sql('red_bytes_sent', 'red_bytes_sent')} FROM metricas LIMIT ?"
+        results.append(summarize("format.safe_format", dataset, measure(
+            lambda: [safe_format(value, 'red_bytes_sent')
+                     for (value,) in engine.db_reader.execute(raw_query, [FORMAT_ROWS])], iterations)))
+        results.append(summarize("format.format_sql", dataset, measure(
+            lambda: engine.db_reader.execute(formatted_query, [FORMAT_ROWS]), iterations)))
+    finally:
+        engine.close()
+    return results
+
+
+class SeededSampler(TopProcessSampler):
+    """
+    Muestreador sin hilo en segundo plano: la instantánea se siembra con sample(), de
+    modo que las consultas medidas no compiten con pasadas concurrentes del muestreador.
+    """
+
+    def start(self):
+        """No arranca el hilo de muestreo."""
+
+
+def bench_processes(iterations):
+    """Mide el muestreador y el Top 10 de CPU sobre la tabla de procesos sintética."""
+    dataset = f"{FAKE_PROCESS_COUNT}_procesos"
+    processes = fake_process_table(FAKE_PROCESS_COUNT)
+    results = []
+    engine = CommandEngine(os.path.join(tempfile.mkdtemp(), "vacia.duckdb"))
+    # La tabla sintética sustituye a psutil, así que el muestreador no debe leer /proc
+    engine.process_sampler = SeededSampler(interval=0.05, use_proc=False)
+    with patched_process_table(processes):
+        try:
+            sampler = engine.process_sampler
+            results.append(summarize("process_sampler.pass", dataset, measure(sampler.sample, iterations)))
+            # Instantánea fija para las consultas: la última pasada medida
+            results.append(summarize("get_top_cpu_processes", dataset, measure(
+                engine.get_top_cpu_processes, iterations)))
+            results.append(summarize("get_top_processes.rss", dataset, measure(
+                lambda: engine.get_top_processes(10, 'rss'), iterations)))
+            records = sampler._records
+            results.append(summarize("process_tree.aggregate", dataset, measure(
+                lambda: aggregate(records, sampler.fields, application_roots(records)), iterations)))
+        finally:
+            engine.close()
+    return results
+
+
+def bench_process_backends(iterations):
+    """
+    Compara una pasada del muestreador con psutil y leyendo /proc directamente,
+    con un árbol real de PROCESS_TREE_SIZE procesos dormidos además de los del sistema.
+    """
+    if not proc_reader.available():
+        print("Se omite la comparación psutil / /proc: /proc no está disponible.", file=sys.stderr)
+        return []
+    results = []
+    with spawn_process_tree(PROCESS_TREE_SIZE):
+        dataset = f"{len([entry for entry in os.listdir('/proc') if entry.isdigit()])}_procesos_reales"
+        for backend, use_proc in (("psutil", False), ("proc", True)):
+            sampler = TopProcessSampler(interval=0.05, use_proc=use_proc)
+            results.append(summarize(f"process_sampler.pass.{backend}", dataset,
+                                     measure(sampler.sample, iterations)))
+    return results
+
+
+def bench_handle_input(db_path, dataset, iterations):
+    """Mide el camino completo de la ventana: entrada, trabajo en el pool y pintura de la burbuja."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtCore import QEventLoop
+    from PyQt6.QtWidgets import QApplication
+    from chat_window import ChatApp
+
+    app = QApplication.instance() or QApplication([])
+    window = ChatApp(db_path=db_path)
+    window.show()
+    results = []
+    try:
+        while window.engine is None:
+            app.processEvents(QEventLoop.ProcessEventsFlag.WaitForMoreEvents)
+        window.engine.db_reader.release_window_seconds = 0.0
+
+        for command in HANDLE_INPUT_COMMANDS:
+            def run_command():
+                window.user_input.setText(command)
+                window.handle_input()
+                while window.pending_messages:
+                    app.processEvents(QEventLoop.ProcessEventsFlag.WaitForMoreEvents)
+                window.chat_history.viewport().repaint()
+            results.append(summarize(f"handle_input[{command}]", dataset, measure(run_command, iterations)))
+    finally:
+        window.close()
+    return results
+
+
+def bench_startup(db_path, dataset, iterations):
+    """Mide el arranque en procesos nuevos: ventana (--profile-startup) y modo --cli."""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    chat_app = os.path.join(REPO_DIR, "chat_app.py")
+    marks = {}
+    cli_samples = []
+    for _ in range(iterations):
+        output = subprocess.run([sys.executable, chat_app, "--profile-startup", "--db", db_path],
+                                capture_output=True, text=True, env=env, timeout=120).stdout
+        for line in output.splitlines():
+            match = PROFILE_MARK_PATTERN.match(line)
+            if match:
+                marks.setdefault(match.group('label'), []).append(float(match.group('ms')))
+
+        start = time.perf_counter()
+        subprocess.run([sys.executable, chat_app, "--cli", "cpu_percent", "--db", db_path],
+                       capture_output=True, env=env, timeout=120, check=True)
+        cli_samples.append((time.perf_counter() - start) * 1000)
+
+    results = [summarize(f"startup.{label.replace(' ', '_')}", dataset, samples)
+               for label, samples in marks.items()]
+    results.append(summarize("startup.cli_cpu_percent", dataset, cli_samples))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compara las medianas con las de una ejecución anterior.
+
+    :return: Lista de textos con las regresiones (mediana mayor que la anterior por más de 'tolerance').
+    """
+    previous = {(item['name'], item['dataset']): item for item in baseline.get('results', [])}
+    regressions = []
+    for item in results:
+        old = previous.get((item['name'], item['dataset']))
+        if old is None or old['median_ms'] <= 0:
+            continue
+        ratio = item['median_ms'] / old['median_ms']
+        if ratio > 1 + tolerance:
+            regressions.append(f"{item['name']} [{item['dataset']}]: {old['median_ms']:.3f} ms -> "
+                               f"{item['median_ms']:.3f} ms (x{ratio:.2f})")
+    return regressions
+
+
+def parse_args(argv):
+    """Analiza los argumentos de la línea de comandos."""
+    parser = argparse.ArgumentParser(description="Pruebas de rendimiento del monitor de métricas.")
+    parser.add_argument("--sizes", default="10k,1m",
+                        help="Tamaños de las bases de datos sintéticas, separados por comas (p. ej. 10k,1m,50m).")
+    parser.add_argument("--hosts", type=int, default=4, help="Hosts de las bases de datos sintéticas.")
+    parser.add_argument("--iterations", type=int, default=50, help="Repeticiones de cada medida.")
+    parser.add_argument("--startup-iterations", type=int, default=5, help="Arranques medidos por tamaño.")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "monitoreo_benchmarks"),
+                        help="Directorio donde se guardan y reutilizan las bases de datos sintéticas.")
+    parser.add_argument("--regenerate", action="store_true",
+                        help="Vuelve a generar las bases de datos aunque ya existan en --workdir.")
+    parser.add_argument("--skip", default="",
+                        help="Grupos a omitir, separados por comas: startup, engine, processes, proc, qt.")
+    parser.add_argument("--output", help="Archivo JSON de salida (por defecto, la salida estándar).")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior con el que comparar.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Aumento relativo de la mediana que se considera regresión (0.25 = 25 %%).")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    skip = {group.strip() for group in args.skip.split(",") if group.strip()}
+    results = []
+
+    if "processes" not in skip:
+        results.extend(bench_processes(args.iterations))
+    if "proc" not in skip:
+        results.extend(bench_process_backends(args.iterations))
+
+    for size in [size.strip() for size in args.sizes.split(",") if size.strip()]:
+        rows = parse_size(size)
+        print(f"Preparando la base de datos de {rows} filas...", file=sys.stderr)
+        db_path = os.path.join(args.workdir, f"metricas_{size}.duckdb")
+        if args.regenerate:
+            generate_metricas_db(db_path, rows, args.hosts)
+        else:
+            ensure_metricas_db(db_path, rows, args.hosts)
+        if "engine" not in skip:
+            results.extend(bench_engine(db_path, size, args.iterations))
+        if "qt" not in skip:
+            results.extend(bench_handle_input(db_path, size, args.iterations))
+        if "startup" not in skip:
+            results.extend(bench_startup(db_path, size, args.startup_iterations))
+
+    report = {
+        'generated_at': datetime.datetime.now().isoformat(timespec="seconds"),
+        'python': platform.python_version(),
+        'duckdb': duckdb.__version__,
+        'platform': platform.platform(),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESIÓN: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Título: Generador de bases de datos 'monitoreo.duckdb' sintéticas para las pruebas de rendimiento
+
+"""
+Este módulo genera archivos DuckDB con la tabla 'metricas' y el mismo esquema
+que escribe el recolector (METRICAS_SCHEMA, 23 columnas). Las filas se crean
+dentro de DuckDB con range(), sin pasar por Python, así que incluso la base de
+50 millones de filas se genera en poco tiempo. Las marcas de tiempo van en orden
+creciente, una muestra por segundo y host, terminando en el momento actual, como
+las que deja el recolector.
+
+Uso directo:
+
+    python benchmarks/synthetic_db.py data/bench.duckdb 1m --hosts 4
+"""
+
+import argparse
+import datetime
+import os
+import sys
+
+import duckdb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics_db import METRICAS_SCHEMA  # noqa: E402
+
+# Tamaños con nombre que acepta la línea de comandos
+SIZE_SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+
+
+def parse_size(text):
+    """Convierte un tamaño como '10k', '1m' o '50m' (o un número) en número de filas."""
+    text = text.strip().lower()
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def column_expression(name, column_type, hosts):
+    """Expresión SQL que genera los valores de una columna a partir del índice de fila 'i'."""
+    if name == "timestamp":
+        return f"CAST(? AS TIMESTAMP) + to_seconds(i // {hosts}) AS timestamp"
+    if name == "hostname":
+        return f"'bench-host-' || (i % {hosts}) AS hostname"
+    if name == "username":
+        return "'bench' AS username"
+    if column_type == "DOUBLE":
+        return f"random() * 100 AS {name}"
+    return f"NULL AS {name}"
+
+
+def generate_metricas_db(db_path, rows, hosts=4, end=None):
+    """
+    Crea (o sustituye) un archivo DuckDB con 'rows' filas sintéticas en 'metricas'.
+
+    :param db_path: Ruta del archivo .duckdb.
+    :param rows: Número de filas.
+    :param hosts: Número de hosts entre los que se reparten las filas.
+    :param end: Instante de la última muestra (por defecto, ahora).
+    """
+    end = end or datetime.datetime.now().replace(microsecond=0)
+    start = end - datetime.timedelta(seconds=max(rows // hosts - 1, 0))
+    for path in (db_path, db_path + ".wal"):
+        if os.path.exists(path):
+            os.remove(path)
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+    columns = ", ".join(f"{name} {column_type}" for name, column_type in METRICAS_SCHEMA)
+    expressions = ", ".join(column_expression(name, column_type, hosts) for name, column_type in METRICAS_SCHEMA)
+    with duckdb.connect(database=db_path) as conn:
+        conn.execute(f"CREATE TABLE metricas ({columns})")
+        conn.execute(f"INSERT INTO metricas SELECT {expressions} FROM range(?) t(i)", [start, rows])
+        conn.execute("CHECKPOINT")
+
+
+def ensure_metricas_db(db_path, rows, hosts=4):
+    """Reutiliza el archivo si ya tiene 'rows' filas; si no, lo genera. Devuelve la ruta."""
+    if os.path.exists(db_path):
+        try:
+            with duckdb.connect(database=db_path, read_only=True) as conn:
+                if conn.execute("SELECT count(*) FROM metricas").fetchone()[0] == rows:
+                    return db_path
+        except duckdb.Error:
+            pass
+    generate_metricas_db(db_path, rows, hosts)
+    return db_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Genera una base de datos de métricas sintética.")
+    parser.add_argument("db_path", help="Ruta del archivo .duckdb a crear.")
+    parser.add_argument("rows", help="Número de filas (admite sufijos: 10k, 1m, 50m).")
+    parser.add_argument("--hosts", type=int, default=4, help="Número de hosts.")
+    args = parser.parse_args()
+    generate_metricas_db(args.db_path, parse_size(args.rows), args.hosts)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# Título: Historial de chat acotado (modelo + delegado de burbujas)
+
+"""
+Este módulo contiene el historial de mensajes del chat como un modelo Qt de
+tamaño acotado y el delegado que dibuja cada mensaje como una burbuja.
+
+El modelo guarda como mucho 'max_messages' mensajes en un búfer circular: al
+llegar al límite se descarta el más antiguo, de modo que la memoria y el coste
+de añadir un mensaje se mantienen constantes durante toda la sesión. La vista
+(QListView) solo dibuja las filas visibles.
+"""
+
+from collections import deque
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QRect, QSize, Qt
+from PyQt6.QtGui import QColor, QPainter
+from PyQt6.QtWidgets import QStyledItemDelegate
+
+from spans import timed
+
+
+class ChatMessageModel(QAbstractListModel):
+    """
+    Modelo de lista con los mensajes del chat. Cada mensaje tiene un identificador
+    creciente que permite sustituir su texto (p. ej. una burbuja provisional)
+    mientras siga en el búfer.
+    """
+    SenderRole = Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, max_messages=500, parent=None):
+        """
+        :param max_messages: Número máximo de mensajes conservados.
+        :param parent: Objeto Qt padre.
+        """
+        super().__init__(parent)
+        self.max_messages = max_messages
+        # Cada entrada es [remitente, texto]; la fila de un mensaje es su id menos _first_id
+        self._messages = deque()
+        self._first_id = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        """Devuelve el número de mensajes en el búfer."""
+        if parent.isValid():
+            return 0
+        return len(self._messages)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        """Devuelve el texto (DisplayRole) o el remitente (SenderRole) de un mensaje."""
+        if not index.isValid() or not 0 <= index.row() < len(self._messages):
+            return None
+        sender, text = self._messages[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return text
+        if role == self.SenderRole:
+            return sender
+        return None
+
+    def append_message(self, sender, text):
+        """
+        Añade un mensaje al final, descartando el más antiguo si el búfer está lleno.
+
+        :param sender: 'bot' o 'user'.
+        :param text: Texto del mensaje.
+        :return: Identificador del mensaje.
+        """
+        if len(self._messages) >= self.max_messages:
+            self.beginRemoveRows(QModelIndex(), 0, 0)
+            self._messages.popleft()
+            self._first_id += 1
+            self.endRemoveRows()
+
+        row = len(self._messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._messages.append([sender, text])
+        self.endInsertRows()
+        return self._first_id + row
+
+    def replace_message(self, message_id, text):
+        """
+        Sustituye el texto de un mensaje.
+
+        :return: False si el mensaje ya salió del búfer.
+        """
+        row = message_id - self._first_id
+        if not 0 <= row < len(self._messages):
+            return False
+        self._messages[row][1] = text
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole])
+        return True
+
+
+class ChatBubbleDelegate(QStyledItemDelegate):
+    """
+    Dibuja cada mensaje como una burbuja redondeada: las del bot a la izquierda y
+    las del usuario a la derecha, con el ancho ajustado al texto.
+    """
+    COLORS = {'bot': QColor("#34495e"), 'user': QColor("#2980b9")}
+    TEXT_COLOR = QColor("#ecf0f1")
+    PADDING = 10
+    MARGIN = 5
+    SIDE_INDENT = 40
+    RADIUS = 15
+    TEXT_FLAGS = Qt.TextFlag.TextWordWrap | Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop
+
+    def __init__(self, view):
+        """
+        :param view: Vista que usa el delegado; su ancho determina el ajuste de línea.
+        """
+        super().__init__(view)
+        self.view = view
+
+    def _text_rect(self, option, text):
+        """Calcula el rectángulo que ocupa el texto ajustado al ancho disponible."""
+        max_width = self.view.viewport().width() - self.SIDE_INDENT - 2 * (self.MARGIN + self.PADDING)
+        return option.fontMetrics.boundingRect(QRect(0, 0, max(max_width, 50), 1_000_000),
+                                               self.TEXT_FLAGS, text)
+
+    def sizeHint(self, option, index):
+        """Devuelve el alto de la burbuja según el texto ajustado al ancho de la vista."""
+        text_rect = self._text_rect(option, index.data().rstrip())
+        return QSize(self.view.viewport().width(),
+                     text_rect.height() + 2 * (self.PADDING + self.MARGIN))
+
+    @timed("qt.paint_bubble")
+    def paint(self, painter, option, index):
+        """Dibuja la burbuja y su texto."""
+        # Los saltos de línea finales no deben dejar hueco al pie de la burbuja
+        text = index.data().rstrip()
+        sender = index.data(ChatMessageModel.SenderRole)
+        text_rect = self._text_rect(option, text)
+
+        bubble_width = text_rect.width() + 2 * self.PADDING
+        bubble_height = text_rect.height() + 2 * self.PADDING
+        top = option.rect.top() + self.MARGIN
+        if sender == 'user':
+            left = option.rect.right() - self.MARGIN - bubble_width
+        else:
+            left = option.rect.left() + self.MARGIN
+        bubble = QRect(left, top, bubble_width, bubble_height)
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(self.COLORS.get(sender, self.COLORS['bot']))
+        painter.drawRoundedRect(bubble, self.RADIUS, self.RADIUS)
+        painter.setPen(self.TEXT_COLOR)
+        painter.setFont(option.font)
+        painter.drawText(bubble.adjusted(self.PADDING, self.PADDING, -self.PADDING, -self.PADDING),
+                         self.TEXT_FLAGS, text)
+        painter.restore()
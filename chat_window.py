@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# Título: Ventana Qt del chat de métricas
+
+"""
+Este módulo contiene la ventana principal (PyQt6) del monitor de métricas. La
+interpretación de los comandos y las consultas están en el motor de comandos
+(command_engine.py); la ventana solo muestra los mensajes, envía las consultas
+al pool de trabajos (job_dispatcher.py) y refresca el panel de vigilancia.
+
+Para que la ventana aparezca cuanto antes, este módulo no importa DuckDB ni
+psutil: la ventana se pinta con el saludo y el motor (command_engine.py, que sí
+los importa) se carga después en el pool de trabajos (ver load_engine). Lo que
+el usuario escriba mientras tanto se atiende en cuanto el motor está listo.
+"""
+
+from PyQt6.QtWidgets import (QMainWindow, QVBoxLayout, QWidget, QListView,
+                             QLineEdit, QLabel)
+from PyQt6.QtCore import QTimer
+from job_dispatcher import JobDispatcher
+from chat_view import ChatMessageModel, ChatBubbleDelegate
+from settings import DB_PATH, GREETING_MESSAGE, WATCH_POLL_INTERVAL_MS
+from spans import timed
+
+
+def load_engine(db_path):
+    """
+    Importa y crea el motor de comandos y arranca el muestreador de procesos, para
+    que la primera petición del Top 10 tenga una muestra lista. Se ejecuta en el pool
+    de trabajos, fuera del hilo de la interfaz.
+
+    :return: El CommandEngine creado.
+    """
+    from command_engine import CommandEngine
+    engine = CommandEngine(db_path)
+    engine.process_sampler.start()
+    return engine
+
+
+class ChatApp(QMainWindow):
+    """
+    Clase principal de la aplicación que crea la ventana y gestiona la lógica
+    del chat para mostrar las métricas del sistema.
+    """
+    def __init__(self, db_path=DB_PATH, profiler=None):
+        """
+        Inicializa la interfaz de usuario y programa la carga del motor de comandos
+        para después de la primera pintura. La conexión de solo lectura la mantiene
+        abierta el gestor ReadOnlyConnectionManager del motor, que la libera
+        periódicamente para el escritor.
+
+        :param db_path: Ruta del archivo DuckDB.
+        :param profiler: StartupProfiler de la opción --profile-startup, o None.
+        """
+        super().__init__()
+        self.setWindowTitle("Simulador de Chat de Métricas")
+        self.setGeometry(100, 100, 600, 800)
+        self.setStyleSheet("""
+            QMainWindow {
+                background-color: #2c3e50;
+            }
+            QLabel {
+                color: #ecf0f1;
+                font-size: 14px;
+                padding: 10px;
+                background-color: #34495e;
+                border-radius: 8px;
+            }
+            QListView {
+                background-color: #2c3e50;
+                color: #ecf0f1;
+                font-size: 14px;
+                border: 2px solid #2980b9;
+                border-radius: 12px;
+                padding: 15px;
+                margin: 10px;
+            }
+            QLineEdit {
+                background-color: #34495e;
+                color: #ecf0f1;
+                font-size: 14px;
+                border: 2px solid #2980b9;
+                border-radius: 12px;
+                padding: 10px;
+                margin: 10px;
+            }
+        """)
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        self.layout = QVBoxLayout()
+        central_widget.setLayout(self.layout)
+
+        # Historial de chat acotado: un modelo con búfer circular y burbujas dibujadas por
+        # un delegado, para que la memoria y el coste de cada mensaje no crezcan con el uso.
+        self.chat_model = ChatMessageModel(max_messages=500, parent=self)
+        self.chat_history = QListView()
+        self.chat_history.setModel(self.chat_model)
+        self.chat_history.setItemDelegate(ChatBubbleDelegate(self.chat_history))
+        self.chat_history.setSelectionMode(QListView.SelectionMode.NoSelection)
+        self.chat_history.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.chat_history.setResizeMode(QListView.ResizeMode.Adjust)
+        self.chat_history.setWordWrap(True)
+        self.layout.addWidget(self.chat_history)
+
+        # Panel compacto del modo de vigilancia ("watch"); se actualiza en el sitio
+        self.watch_pane = QLabel()
+        self.watch_pane.hide()
+        self.layout.addWidget(self.watch_pane)
+
+        self.user_input = QLineEdit()
+        self.user_input.setPlaceholderText("Escribe el número o nombre de la métrica (añade un rango como '1h' para ver su historial)...")
+        self.user_input.returnPressed.connect(self.handle_input)
+        self.layout.addWidget(self.user_input)
+
+        # Motor de comandos (conexión de solo lectura, cachés, lista de métricas y vigilancia);
+        # se crea en segundo plano con load_engine. Hasta entonces las entradas se encolan.
+        self.engine = None
+        self.engine_job_id = None
+        self.queued_inputs = []
+        self.db_path = db_path
+        self.profiler = profiler
+
+        # Despachador de trabajos: DuckDB y psutil se consultan fuera del hilo de la interfaz.
+        # pending_messages asocia cada trabajo con el identificador de su burbuja provisional.
+        self.jobs = JobDispatcher(self)
+        self.jobs.job_finished.connect(self.on_job_finished)
+        self.jobs.job_failed.connect(self.on_job_failed)
+        self.jobs.job_cancelled.connect(self.on_job_cancelled)
+        self.pending_messages = {}
+
+        # Modo de vigilancia: trabajo de sondeo en curso y temporizador de sondeo
+        self.watch_job_id = None
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setInterval(WATCH_POLL_INTERVAL_MS)
+        self.watch_timer.timeout.connect(self.poll_watch)
+
+        # Estado inicial: el saludo se pinta ya; la lista de métricas llega con el motor.
+        # El temporizador de 0 ms dispara la carga cuando el bucle de eventos ya está en marcha.
+        self.append_bot_message(GREETING_MESSAGE)
+        QTimer.singleShot(0, self.start_engine)
+
+    def start_engine(self):
+        """Envía al pool de trabajos la carga del motor de comandos."""
+        self.engine_job_id = self.jobs.submit("engine", load_engine, self.db_path)
+
+    def on_engine_ready(self, engine):
+        """Instala el motor recién creado, muestra la lista de métricas y atiende las entradas encoladas."""
+        self.engine = engine
+        if self.profiler is not None:
+            self.profiler.mark("motor listo")
+        self.append_bot_message(self.engine.metrics_list_message())
+        queued, self.queued_inputs = self.queued_inputs, []
+        for user_text in queued:
+            self.run_command(user_text)
+
+    def closeEvent(self, event):
+        """Detiene los trabajos y el muestreo de procesos y cierra la conexión de solo lectura al salir."""
+        self.watch_timer.stop()
+        self.jobs.shutdown()
+        if self.engine is not None:
+            self.engine.close()
+        super().closeEvent(event)
+
+    @timed("qt.append_bot_message")
+    def append_bot_message(self, message):
+        """
+        Añade un mensaje del bot al historial de chat con estilo de burbuja izquierda.
+
+        :return: Identificador del mensaje en el modelo del historial.
+        """
+        message_id = self.chat_model.append_message('bot', message)
+        self.chat_history.scrollToBottom()
+        return message_id
+
+    def append_pending_message(self, message="Consultando..."):
+        """
+        Añade una burbuja provisional del bot mientras un trabajo está en curso.
+
+        :return: Identificador del mensaje, para sustituirlo con replace_bot_message.
+        """
+        return self.append_bot_message(message)
+
+    @timed("qt.replace_bot_message")
+    def replace_bot_message(self, message_id, message):
+        """
+        Sustituye el contenido de una burbuja provisional por el mensaje definitivo.
+        Si la burbuja ya salió del historial, el mensaje se añade al final.
+        """
+        if not self.chat_model.replace_message(message_id, message):
+            self.append_bot_message(message)
+            return
+        self.chat_history.scrollToBottom()
+
+    @timed("qt.append_user_message")
+    def append_user_message(self, message):
+        """Añade un mensaje del usuario al historial de chat con estilo de burbuja derecha."""
+        self.chat_model.append_message('user', f"Tú: {message}")
+        self.chat_history.scrollToBottom()
+
+    def handle_input(self):
+        """
+        Maneja la entrada del usuario con el motor de comandos. Las respuestas que
+        requieren DuckDB o psutil se calculan en el pool de trabajos: se muestra una
+        burbuja provisional que se sustituye por el resultado al terminar.
+        """
+        user_text = self.user_input.text().strip()
+        if not user_text:
+            return
+
+        self.append_user_message(user_text.lower())
+        self.user_input.clear()
+
+        if self.engine is None:
+            self.queued_inputs.append(user_text)
+            return
+        self.run_command(user_text)
+
+    def run_command(self, user_text):
+        """Ejecuta un comando con el motor y muestra su respuesta o lanza su consulta."""
+        result = self.engine.execute(user_text)
+        if result.reply is not None:
+            self.append_bot_message(result.reply)
+        if result.fn is not None:
+            # Un trabajo nuevo con la misma clave reemplaza al anterior si aún no ha terminado
+            pending = self.append_pending_message()
+            job_id = self.jobs.submit(result.job_key, result.fn, *result.args)
+            self.pending_messages[job_id] = pending
+        if result.watch_changed:
+            self.sync_watch()
+
+    def sync_watch(self):
+        """Arranca, reinicia o detiene el sondeo y el panel según el estado de vigilancia del motor."""
+        if self.watch_job_id is not None:
+            self.jobs.cancel(self.watch_job_id)
+            self.watch_job_id = None
+        if not self.engine.watch_metrics:
+            self.watch_timer.stop()
+            self.watch_pane.hide()
+            return
+        self.watch_pane.setText("Vigilando: esperando datos...")
+        self.watch_pane.show()
+        self.watch_timer.start()
+        self.poll_watch()
+
+    def poll_watch(self):
+        """
+        Tick del temporizador de vigilancia. Si el archivo no ha cambiado desde el
+        último sondeo no se consulta nada; si cambió, se piden en segundo plano solo
+        las filas posteriores a la última marca de tiempo vista.
+        """
+        if self.watch_job_id is not None or not self.engine.watch_poll_due():
+            return
+        self.watch_job_id = self.jobs.submit("watch", self.engine.fetch_watch_rows,
+                                             *self.engine.watch_arguments())
+
+    def update_watch_pane(self, rows):
+        """Incorpora las filas nuevas a las tendencias y redibuja el panel de vigilancia."""
+        text = self.engine.apply_watch_rows(rows)
+        if text is not None:
+            self.watch_pane.setText(text)
+
+    def on_job_finished(self, job_id, response):
+        """Muestra el resultado de un trabajo en su burbuja provisional."""
+        if job_id == self.engine_job_id:
+            self.engine_job_id = None
+            self.on_engine_ready(response)
+            return
+        if job_id == self.watch_job_id:
+            self.watch_job_id = None
+            self.update_watch_pane(response)
+            return
+        pending = self.pending_messages.pop(job_id, None)
+        if pending is not None:
+            self.replace_bot_message(pending, response)
+
+    def on_job_failed(self, job_id, error):
+        """Muestra en la burbuja provisional el error inesperado de un trabajo."""
+        if job_id == self.engine_job_id:
+            self.engine_job_id = None
+            self.append_bot_message(f"No se pudo iniciar el motor de consultas: {error}")
+            if self.profiler is not None:
+                # El informe de --profile-startup sale igualmente, con el motor sin alcanzar
+                self.profiler.mark("motor fallido")
+            return
+        if job_id == self.watch_job_id:
+            self.watch_job_id = None
+            self.update_watch_pane({'error': f"Error en el modo de vigilancia: {error}"})
+            return
+        pending = self.pending_messages.pop(job_id, None)
+        if pending is not None:
+            self.replace_bot_message(pending, f"Error al procesar la consulta: {error}")
+
+    def on_job_cancelled(self, job_id):
+        """Marca como reemplazada la burbuja de un trabajo sustituido por otro más reciente."""
+        pending = self.pending_messages.pop(job_id, None)
+        if pending is not None:
+            self.replace_bot_message(pending, "Consulta reemplazada por una más reciente.")
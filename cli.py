@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# Título: Línea de comandos del chat de métricas (sin interfaz gráfica)
+
+"""
+Este módulo contiene los modos sin interfaz gráfica del monitor de métricas:
+
+    python chat_app.py --cli "cpu_percent"     # un comando y termina
+    python chat_app.py --repl                  # sesión interactiva en la terminal
+
+Usan el mismo motor de comandos que la ventana (command_engine.py) pero nunca
+importan PyQt6, así que arrancan rápido y sirven para cron o sesiones SSH. Las
+consultas se ejecutan directamente en el hilo principal. El modo de vigilancia
+("watch ...") imprime el panel cada vez que llegan filas nuevas, hasta Ctrl+C.
+"""
+
+import time
+
+from command_engine import CommandEngine
+from settings import GREETING_MESSAGE, WATCH_POLL_INTERVAL_MS
+
+# Comandos que terminan la sesión interactiva
+REPL_EXIT_COMMANDS = ("salir", "exit", "quit")
+
+
+def print_result(result):
+    """Imprime la respuesta inmediata de un comando y, si la hay, la de su consulta."""
+    if result.reply is not None:
+        print(result.reply)
+    if result.fn is not None:
+        print(result.fn(*result.args))
+
+
+def follow_watch(engine):
+    """Imprime el panel de vigilancia cada vez que cambia, hasta Ctrl+C (que detiene la vigilancia)."""
+    print("Ctrl+C para dejar de vigilar.")
+    try:
+        while engine.watch_metrics:
+            if engine.watch_poll_due():
+                text = engine.apply_watch_rows(engine.fetch_watch_rows(*engine.watch_arguments()))
+                if text is not None:
+                    print(text + "\n")
+            time.sleep(WATCH_POLL_INTERVAL_MS / 1000)
+    except KeyboardInterrupt:
+        engine.stop_watch()
+        print()
+
+
+def run_cli(db_path, command):
+    """Ejecuta un único comando (opción --cli) e imprime su respuesta."""
+    engine = CommandEngine(db_path)
+    try:
+        result = engine.execute(command)
+        print_result(result)
+        if result.watch_changed and engine.watch_metrics:
+            follow_watch(engine)
+    finally:
+        engine.close()
+
+
+def run_repl(db_path):
+    """Sesión interactiva en la terminal (opción --repl) hasta 'salir', Ctrl+D o Ctrl+C."""
+    engine = CommandEngine(db_path)
+    print(GREETING_MESSAGE)
+    print(engine.metrics_list_message())
+    try:
+        while True:
+            try:
+                line = input("> ")
+            except (EOFError, KeyboardInterrupt):
+                print()
+                break
+            if line.strip().lower() in REPL_EXIT_COMMANDS:
+                break
+            result = engine.execute(line)
+            print_result(result)
+            if result.watch_changed and engine.watch_metrics:
+                follow_watch(engine)
+    finally:
+        engine.close()
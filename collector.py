@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+# Título: Recolector de métricas del sistema y escritor por lotes en DuckDB
+
+"""
+Este módulo contiene el proceso de escritura que alimenta la tabla 'metricas'
+del archivo 'monitoreo.duckdb'. Se ejecuta con:
+
+    python chat_app.py --collect
+
+Las métricas se muestrean con psutil cada 'sample_interval' segundos y se
+acumulan en memoria. Cada 'flush_interval' segundos se abre una conexión de
+escritura, se insertan todas las filas acumuladas con una única sentencia
+INSERT por tabla (cargando un CSV temporal con read_csv) y se cierra la
+conexión. Así el bloqueo del archivo solo se mantiene durante el volcado y la
+aplicación de chat puede leerlo el resto del tiempo. Si el archivo está bloqueado, las filas se conservan (hasta
+'max_buffer') y el volcado se reintenta con esperas cortas hasta que el lector
+suelta el archivo; al detenerse, el volcado final reintenta hasta un plazo.
+
+Cada 'process_interval' segundos se guardan además los 'process_top_k' grupos de
+procesos (por nombre) con más consumo de CPU y los 'process_top_k' con más memoria
+en la tabla 'process_samples', en el mismo volcado por lotes, para poder preguntar
+después qué consumía CPU o memoria a una hora dada ("top_10_cpu at 03:00",
+"top 5 rss at 03:00").
+
+Cada 'maintenance_interval' segundos, el volcado aprovecha la misma conexión
+para ejecutar el mantenimiento (agregados, archivo Parquet y retención, ver
+maintenance.py), una vez confirmada la inserción: sus errores se registran sin
+afectar a las filas ya escritas.
+"""
+
+import datetime
+import getpass
+import os
+import socket
+import sys
+import tempfile
+import time
+from collections import deque
+
+import duckdb
+import psutil
+
+from archive import archive_path
+from metrics_db import METRICAS_SCHEMA, PROCESS_SAMPLE_FIELDS, PROCESS_SAMPLES_SCHEMA
+from maintenance import migrate_timestamp_column, run_maintenance
+from process_monitor import TopProcessSampler, top_groups
+
+GB = 1024 ** 3
+
+# Reintentos del volcado con el archivo bloqueado: espera inicial y máxima entre intentos.
+# La máxima es menor que la ventana de liberación del lector (1 s), para no perderla.
+FLUSH_RETRY_BACKOFF_SECONDS = 0.05
+FLUSH_RETRY_MAX_BACKOFF_SECONDS = 0.25
+
+# Tiempo máximo que el volcado final sigue reintentando al detener el recolector; cubre
+# la retención máxima de la conexión del lector (5 s) y su ventana de liberación
+SHUTDOWN_FLUSH_TIMEOUT_SECONDS = 15.0
+
+
+def create_metricas_table(conn):
+    """Crea la tabla 'metricas' si todavía no existe."""
+    columns = ", ".join(f"{name} {column_type}" for name, column_type in METRICAS_SCHEMA)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS metricas ({columns})")
+
+
+def create_process_samples_table(conn):
+    """Crea la tabla 'process_samples' si todavía no existe."""
+    columns = ", ".join(f"{name} {column_type}" for name, column_type in PROCESS_SAMPLES_SCHEMA)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS process_samples ({columns})")
+
+
+def csv_value(value):
+    """Escribe un valor como campo CSV: NULL sin comillas y el texto siempre entre comillas."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def write_batch_file(rows):
+    """
+    Escribe las filas en un archivo CSV temporal para cargarlas con read_csv.
+
+    :return: Ruta del archivo; quien lo pide debe borrarlo.
+    """
+    fd, path = tempfile.mkstemp(prefix="monitoreo-", suffix=".csv")
+    with open(fd, "w", encoding="utf-8", newline="") as f:
+        f.writelines(",".join(map(csv_value, row)) + "\n" for row in rows)
+    return path
+
+
+def insert_rows(conn, table, schema, path):
+    """
+    Inserta en la tabla las filas de un archivo de write_batch_file con una única
+    sentencia INSERT ... SELECT sobre read_csv. Un INSERT parametrizado de varias filas
+    cuesta unos 2 ms por fila en DuckDB (varios segundos para un búfer lleno, con el
+    archivo bloqueado); read_csv carga miles de filas en décimas de segundo. Las
+    columnas se nombran, para no depender de su orden ni de columnas añadidas después.
+    """
+    columns = ", ".join(name for name, _ in schema)
+    types = ", ".join(f"'{name}': '{column_type}'" for name, column_type in schema)
+    # Las comillas vacías son texto vacío; solo un campo vacío sin comillas es NULL
+    conn.execute(f"INSERT INTO {table} ({columns}) SELECT * FROM read_csv(?, header = false, delim = ',', "
+                 f"quote = '\"', escape = '\"', allow_quoted_nulls = false, columns = {{{types}}})", [path])
+
+
+def read_cpu_temperature():
+    """Devuelve la temperatura de la CPU en °C, o None si el sistema no la expone a psutil."""
+    sensors = getattr(psutil, "sensors_temperatures", None)
+    if sensors is None:
+        return None
+    try:
+        temperatures = sensors()
+    except (OSError, RuntimeError):
+        return None
+    for name in ("coretemp", "k10temp", "cpu_thermal", "cpu-thermal", "acpitz"):
+        if temperatures.get(name):
+            return temperatures[name][0].current
+    return None
+
+
+def collect_sample(hostname, username, disk_path):
+    """
+    Toma una muestra de las métricas del sistema.
+
+    :return: Tupla con los valores en el orden de METRICAS_SCHEMA.
+    """
+    vm = psutil.virtual_memory()
+    swap = psutil.swap_memory()
+    disk = psutil.disk_usage(disk_path)
+    net = psutil.net_io_counters()
+    freq = psutil.cpu_freq()
+    per_cpu_freq = psutil.cpu_freq(percpu=True) or []
+    battery = psutil.sensors_battery() if hasattr(psutil, "sensors_battery") else None
+
+    return (
+        datetime.datetime.now(),
+        hostname,
+        username,
+        psutil.cpu_percent(None),
+        freq.current if freq else None,
+        vm.percent,
+        vm.used / GB,
+        vm.total / GB,
+        # Memoria disponible para nuevos procesos (incluye la caché liberable)
+        vm.available / GB,
+        disk.percent,
+        disk.used / GB,
+        disk.total / GB,
+        disk.free / GB,
+        swap.percent,
+        swap.used / GB,
+        swap.total / GB,
+        net.bytes_sent if net else None,
+        net.bytes_recv if net else None,
+        read_cpu_temperature(),
+        battery.percent if battery else None,
+        # La potencia de la CPU requiere un monitor de hardware externo; psutil no la expone
+        None,
+        None,
+        sum(f.current for f in per_cpu_freq) / len(per_cpu_freq) if per_cpu_freq else None,
+    )
+
+
+class MetricsCollector:
+    """
+    Muestrea las métricas del sistema y las escribe por lotes en la tabla 'metricas'.
+    """
+
+    def __init__(self, db_path, sample_interval=1.0, flush_interval=10.0, max_buffer=3600,
+                 maintenance_interval=300.0, process_interval=10.0, process_top_k=20):
+        """
+        :param db_path: Ruta del archivo .duckdb.
+        :param sample_interval: Segundos entre dos muestras.
+        :param flush_interval: Segundos entre dos volcados a la base de datos.
+        :param max_buffer: Máximo de filas pendientes si la base de datos no está disponible
+                           (se descartan las más antiguas).
+        :param maintenance_interval: Segundos entre dos ejecuciones del mantenimiento
+                                     (None para no ejecutarlo desde el recolector).
+        :param process_interval: Segundos entre dos muestras de procesos (None para no guardarlas).
+        :param process_top_k: Grupos de procesos con más CPU, y con más memoria, que se guardan por muestra.
+        """
+        self.db_path = db_path
+        self.sample_interval = sample_interval
+        self.flush_interval = flush_interval
+        self.buffer = deque(maxlen=max_buffer)
+        self.hostname = socket.gethostname()
+        self.username = getpass.getuser()
+        self.disk_path = os.path.abspath(os.sep)
+        self._table_ready = False
+        self._flush_failures = 0
+        self.maintenance_interval = maintenance_interval
+        self._next_maintenance = time.monotonic()
+        self.process_interval = process_interval
+        self.process_top_k = process_top_k
+        self.process_buffer = deque(maxlen=max_buffer)
+        self.process_sampler = TopProcessSampler(interval=process_interval or 1.0)
+        self._next_process_sample = time.monotonic()
+
+    def sample(self):
+        """Toma una muestra y la añade al búfer."""
+        self.buffer.append(collect_sample(self.hostname, self.username, self.disk_path))
+
+    def sample_processes(self):
+        """
+        Añade al búfer de procesos los grupos con más CPU desde la muestra anterior y los
+        grupos con más memoria (ver PROCESS_SAMPLE_FIELDS); un grupo que está en ambos se
+        guarda una sola vez.
+        """
+        aggregated = self.process_sampler.sample()
+        now = datetime.datetime.now()
+        selected = {}
+        for field in PROCESS_SAMPLE_FIELDS:
+            selected.update(top_groups(aggregated, self.process_top_k, field))
+        for name, data in selected.items():
+            self.process_buffer.append((now, self.hostname, name, data['count'],
+                                        data['cpu_percent'], data.get('rss')))
+
+    def flush(self):
+        """
+        Escribe las filas de los búferes (métricas y procesos) con una única sentencia
+        INSERT por tabla (ver insert_rows), en una sola transacción, manteniendo abierta la
+        conexión de escritura solo durante el volcado. Las filas salen de los búferes en
+        cuanto la transacción se confirma; el mantenimiento se ejecuta después, por
+        separado, y un fallo suyo no vuelve a insertarlas.
+
+        :return: Número de filas de 'metricas' escritas, o None si el archivo estaba bloqueado.
+        """
+        if not self.buffer and not self.process_buffer:
+            return 0
+        rows = list(self.buffer)
+        process_rows = list(self.process_buffer)
+        # Los archivos del lote se escriben antes de abrir la conexión, fuera del bloqueo
+        batch_files = {}
+        if rows:
+            batch_files["metricas"] = write_batch_file(rows)
+        if process_rows:
+            batch_files["process_samples"] = write_batch_file(process_rows)
+        try:
+            with duckdb.connect(database=self.db_path) as conn:
+                if not self._table_ready:
+                    create_metricas_table(conn)
+                    create_process_samples_table(conn)
+                    # Las filas nuevas llevan TIMESTAMP: una tabla antigua se migra antes de insertar
+                    migrate_timestamp_column(conn)
+                    self._table_ready = True
+                conn.begin()
+                if rows:
+                    insert_rows(conn, "metricas", METRICAS_SCHEMA, batch_files["metricas"])
+                if process_rows:
+                    insert_rows(conn, "process_samples", PROCESS_SAMPLES_SCHEMA, batch_files["process_samples"])
+                conn.commit()
+                for _ in rows:
+                    self.buffer.popleft()
+                for _ in process_rows:
+                    self.process_buffer.popleft()
+                self._flush_failures = 0
+
+                if self.maintenance_interval is not None and time.monotonic() >= self._next_maintenance:
+                    self.run_maintenance(conn)
+        except duckdb.IOException as e:
+            # El archivo está bloqueado por un lector: se reintenta con una espera corta (ver run)
+            if self._flush_failures == 0:
+                print(f"No se pudo escribir en '{self.db_path}' ({e}); {len(self.buffer)} filas pendientes.",
+                      file=sys.stderr)
+            self._flush_failures += 1
+            return None
+        finally:
+            for path in batch_files.values():
+                os.remove(path)
+        return len(rows)
+
+    def run_maintenance(self, conn):
+        """
+        Ejecuta el mantenimiento sobre la conexión del volcado. Los errores se registran
+        y no se propagan, y la siguiente ejecución se programa igualmente, para que un
+        fallo persistente no se repita en cada volcado.
+        """
+        self._next_maintenance = time.monotonic() + self.maintenance_interval
+        try:
+            summary = run_maintenance(conn, archive_dir=archive_path(self.db_path))
+        except duckdb.Error as e:
+            print(f"Error en el mantenimiento de '{self.db_path}': {e}", file=sys.stderr)
+            return
+        if "archive_error" in summary:
+            print(f"Error de archivo: {summary['archive_error']}", file=sys.stderr)
+
+    def flush_until(self, deadline):
+        """
+        Intenta el volcado hasta que se escriba o hasta 'deadline' (time.monotonic), con
+        una espera creciente entre intentos. Se usa en el volcado final, para no perder las
+        filas pendientes si un lector tiene el archivo abierto en ese momento.
+
+        :return: Número de filas de 'metricas' escritas, o None si no se pudo escribir.
+        """
+        backoff = FLUSH_RETRY_BACKOFF_SECONDS
+        while True:
+            written = self.flush()
+            if written is not None or time.monotonic() + backoff > deadline:
+                return written
+            time.sleep(backoff)
+            backoff = min(backoff * 2, FLUSH_RETRY_MAX_BACKOFF_SECONDS)
+
+    def run(self):
+        """
+        Bucle principal: muestrea periódicamente y vuelca por lotes hasta Ctrl+C. Si el
+        archivo está bloqueado, el volcado se reintenta con una espera corta y creciente
+        (sin dejar de muestrear), de modo que se aprovecha la ventana en que el lector
+        suelta la conexión (release_window_seconds en metrics_db.py).
+        """
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        # La primera lectura de cpu_percent(None) solo prepara el contador (también la de procesos)
+        psutil.cpu_percent(None)
+        if self.process_interval is not None:
+            self.process_sampler.sample()
+            self._next_process_sample = time.monotonic() + self.process_interval
+        print(f"Recolectando métricas en '{self.db_path}' cada {self.sample_interval}s "
+              f"(volcado cada {self.flush_interval}s). Ctrl+C para detener.")
+        next_sample = time.monotonic() + self.sample_interval
+        next_flush = time.monotonic() + self.flush_interval
+        backoff = FLUSH_RETRY_BACKOFF_SECONDS
+        try:
+            while True:
+                time.sleep(max(0.0, min(next_sample, next_flush) - time.monotonic()))
+                if time.monotonic() >= next_sample:
+                    self.sample()
+                    next_sample = time.monotonic() + self.sample_interval
+                if self.process_interval is not None and time.monotonic() >= self._next_process_sample:
+                    self.sample_processes()
+                    self._next_process_sample = time.monotonic() + self.process_interval
+                if time.monotonic() >= next_flush:
+                    if self.flush() is None:
+                        next_flush = time.monotonic() + backoff
+                        backoff = min(backoff * 2, FLUSH_RETRY_MAX_BACKOFF_SECONDS)
+                    else:
+                        next_flush = time.monotonic() + self.flush_interval
+                        backoff = FLUSH_RETRY_BACKOFF_SECONDS
+        except KeyboardInterrupt:
+            pass
+        finally:
+            written = self.flush_until(time.monotonic() + SHUTDOWN_FLUSH_TIMEOUT_SECONDS)
+            if written is None:
+                print(f"Recolector detenido sin poder escribir {len(self.buffer)} filas pendientes.", file=sys.stderr)
+            else:
+                print(f"Recolector detenido ({written} filas escritas en el volcado final).")
@@ -0,0 +1,1126 @@
+# -*- coding: utf-8 -*-
+# Título: Motor de comandos del chat de métricas (independiente de la interfaz)
+
+"""
+Este módulo contiene el motor que interpreta los comandos del chat (nombre o
+número de una métrica, historial, flota, host, vigilancia, opciones) y hace las
+consultas a DuckDB y al muestreador de procesos. No importa PyQt6: lo usan tanto
+la ventana Qt (chat_window.py) como la línea de comandos (cli.py, opciones
+--cli y --repl de chat_app.py).
+
+El motor no decide dónde se ejecuta el trabajo. CommandEngine.execute devuelve
+un CommandResult con la respuesta inmediata y, si hace falta consultar datos, la
+función a llamar: la ventana la envía a su pool de trabajos y la línea de
+comandos la llama directamente. Las funciones de consulta no tocan ninguna
+interfaz, así que se pueden ejecutar en cualquier hilo.
+"""
+
+import os
+import re
+import math
+import datetime
+import functools
+from collections import deque
+
+import duckdb
+
+from metrics_db import ReadOnlyConnectionManager, LatestRowCache
+from process_monitor import PROCESS_RANKINGS, TopProcessSampler, top_groups
+from maintenance import ROLLUP_TIERS
+from archive import ARCHIVE_VIEW, archive_partition_filter, archive_path, create_archive_view
+from settings import DB_PATH
+from spans import recorder, timed
+
+# Columnas de 'metricas' que no son métricas numéricas
+NON_METRIC_COLUMNS = {'timestamp', 'hostname', 'username'}
+
+# Tipos de DuckDB que se consideran métricas numéricas al leer el esquema
+NUMERIC_TYPES = ('DOUBLE', 'FLOAT', 'REAL', 'DECIMAL', 'TINYINT', 'SMALLINT', 'INTEGER',
+                 'BIGINT', 'HUGEINT', 'UTINYINT', 'USMALLINT', 'UINTEGER', 'UBIGINT')
+
+# Formato de visualización de cada métrica: unidad y divisor que se aplica al valor
+# guardado (los bytes de red se muestran en MB). Es la única tabla de formatos: la
+# usan tanto safe_format (valores sueltos) como format_sql (columnas enteras en DuckDB).
+METRIC_FORMATS = {
+    'cpu_percent': ('%', 1),
+    'cpu_freq': ('MHz', 1),
+    'ram_percent': ('%', 1),
+    'ram_used': ('GB', 1),
+    'ram_total': ('GB', 1),
+    'ram_free': ('GB', 1),
+    'disk_percent': ('%', 1),
+    'disk_used': ('GB', 1),
+    'disk_total': ('GB', 1),
+    'disk_free': ('GB', 1),
+    'swap_percent': ('%', 1),
+    'swap_usado': ('GB', 1),
+    'swap_total': ('GB', 1),
+    'red_bytes_sent': ('MB', 1024 ** 2),
+    'red_bytes_recv': ('MB', 1024 ** 2),
+    'cpu_temp_celsius': ('°C', 1),
+    'battery_percent': ('%', 1),
+    'cpu_power_package': ('W', 1),
+    'cpu_power_cores': ('W', 1),
+    'cpu_clocks': ('MHz', 1),
+}
+
+# Formato de las columnas numéricas sin entrada en METRIC_FORMATS: sin unidad ni escala
+DEFAULT_METRIC_FORMAT = ('', 1)
+
+# Formato de las marcas de tiempo en el chat (strftime, igual en Python y en DuckDB)
+TIMESTAMP_FORMAT = "%H:%M:%S %d/%m/%Y"
+
+# Consultas de historial: "<métrica> <cantidad><unidad>", p. ej. "cpu_percent 1h" o "ram percent last 7d"
+HISTORY_PATTERN = re.compile(r"^(?P<metric>.+?)\s+(?:last\s+)?(?P<amount>\d+)\s*(?P<unit>[smhdw])$")
+RANGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+# Número máximo de puntos de un historial, sea cual sea el rango pedido
+HISTORY_MAX_POINTS = 24
+
+# Anchos de intervalo (segundos) entre los que se elige el de cada historial
+HISTORY_BUCKET_STEPS = (1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800,
+                        3600, 7200, 10800, 21600, 43200, 86400, 172800, 604800)
+
+SPARKLINE_CHARS = "▁▂▃▄▅▆▇█"
+
+# Modo de vigilancia: número de valores recientes por métrica (el intervalo de sondeo está en settings.py)
+WATCH_TREND_POINTS = 30
+
+# Clasificación de procesos: "top <n> [cpu|rss|io_read|io_write|threads|handles] [tree]"
+TOP_PATTERN = re.compile(r"^top\s+(?P<n>\d+)(?:\s+(?!tree$)(?P<ranking>\w+))?(?:\s+(?P<grouping>tree))?$")
+TOP_MAX_PROCESSES = 100
+
+# Consultas del historial de procesos: "top_10_cpu at 03:00", "top 5 rss at 2026-03-01 14:30"
+PROCESS_AT_PATTERN = re.compile(r"^(?P<command>.+?)\s+at\s+(?:(?P<date>\d{4}-\d{2}-\d{2})\s+)?"
+                                r"(?P<hour>\d{1,2}):(?P<minute>\d{2})$")
+
+# Columna de 'process_samples' de cada clasificación que guarda el recolector
+PROCESS_SAMPLE_COLUMNS = {'cpu': 'cpu_percent', 'rss': 'rss'}
+
+# Segundos de muestras que se resumen a partir de la hora pedida
+PROCESS_HISTORY_WINDOW_SECONDS = 60
+
+# Título y formato del valor de cada clasificación de procesos
+RANKING_LABELS = {
+    'cpu': ("consumo de CPU", lambda value: f"{value:.2f}%"),
+    'rss': ("memoria residente (RSS)", lambda value: f"{value / 1024 ** 2:.1f} MB"),
+    'io_read': ("lectura de disco", lambda value: f"{value / 1024:.1f} KB/s"),
+    'io_write': ("escritura en disco", lambda value: f"{value / 1024:.1f} KB/s"),
+    'threads': ("número de hilos", lambda value: f"{value} hilos"),
+    'handles': ("número de handles", lambda value: f"{value} handles"),
+}
+
+# Título de cada agrupación de procesos y nombre de la cuenta de procesos de cada grupo
+GROUPING_LABELS = {
+    'name': ("Agrupado por Nombre", "Instancias"),
+    'tree': ("Agrupado por Aplicación", "Procesos"),
+}
+
+# Vista de flota: antigüedad (segundos) a partir de la cual un host se lista aparte, como
+# sin datos recientes, y número máximo de hosts que se listan en cada parte de la respuesta
+FLEET_STALE_SECONDS = 3600
+FLEET_MAX_ROWS = 50
+
+
+def safe_format(value, metric_key):
+    """
+    Formatea un valor suelto de una métrica según METRIC_FORMATS. Para columnas
+    enteras (historial, flota) se usa format_sql, que da el mismo texto en DuckDB.
+    """
+    if value is None:
+        return None
+    unit, divisor = METRIC_FORMATS.get(metric_key, DEFAULT_METRIC_FORMAT)
+    try:
+        numeric_value = float(value) / divisor
+    except (ValueError, TypeError):
+        # Si el valor no es convertible a float (es una cadena inesperada),
+        # se devuelve una indicación de error.
+        return "N/A"
+    # Las columnas sin unidad conocida se muestran sin sufijo
+    return f"{numeric_value:.2f} {unit}" if unit else f"{numeric_value:.2f}"
+
+def format_sql(expression, metric_key):
+    """
+    Devuelve la expresión SQL que formatea en DuckDB una columna entera de una métrica
+    con printf, con el mismo resultado que safe_format valor a valor (NULL sigue siendo NULL).
+
+    :param expression: Expresión SQL con los valores sin formatear.
+    """
+    unit, divisor = METRIC_FORMATS.get(metric_key, DEFAULT_METRIC_FORMAT)
+    pattern = "%.2f" + (" " + unit.replace("%", "%%") if unit else "")
+    return f"printf('{pattern}', CAST({expression} AS DOUBLE) / {divisor})"
+
+@timed("format_metrics")
+def format_metrics(metrics):
+    """
+    Aplica el formato de visualización a un registro de 'metricas' (valores sin
+    formatear): unidades con safe_format y la marca de tiempo con format_timestamp.
+    Las columnas numéricas nuevas, sin unidad conocida, se formatean sin sufijo.
+    """
+    formatted = {}
+    for key, value in metrics.items():
+        if key == 'timestamp':
+            formatted[key] = format_timestamp(value)
+        elif key in METRIC_FORMATS or (key not in NON_METRIC_COLUMNS and isinstance(value, (int, float))):
+            formatted[key] = safe_format(value, key)
+        else:
+            formatted[key] = value
+    return formatted
+
+def unknown_host_error(host):
+    """
+    Devuelve el diccionario de error de un host sin filas en 'metricas'. Lleva además
+    'not_found' para que la API HTTP responda 404 en lugar de 503 (base no disponible).
+    """
+    return {'error': f"No hay datos del host '{host}' en la tabla de métricas.", 'not_found': True}
+
+
+def host_condition(host):
+    """
+    Devuelve la condición SQL y sus parámetros para limitar una consulta a un host
+    (columna 'hostname', sin distinguir mayúsculas), o una condición neutra si host es None.
+    """
+    if host is None:
+        return "TRUE", []
+    return "lower(hostname) = ?", [host.lower()]
+
+def history_bucket_seconds(range_seconds):
+    """Devuelve el ancho de intervalo más pequeño que mantiene el historial dentro de HISTORY_MAX_POINTS."""
+    minimum = math.ceil(range_seconds / (HISTORY_MAX_POINTS - 1))
+    for step in HISTORY_BUCKET_STEPS:
+        if step >= minimum:
+            return step
+    return minimum
+
+def sparkline(values):
+    """Representa una serie de valores como una línea de bloques Unicode."""
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARKLINE_CHARS[0] * len(values)
+    scale = (len(SPARKLINE_CHARS) - 1) / (high - low)
+    return "".join(SPARKLINE_CHARS[round((value - low) * scale)] for value in values)
+
+def format_timestamp(raw_timestamp):
+    """
+    Convierte la marca de tiempo almacenada al formato de visualización del chat.
+    DuckDB ya la devuelve como datetime; las bases de datos todavía no migradas
+    (texto ISO) se interpretan con fromisoformat.
+    """
+    if raw_timestamp is None:
+        return None
+    if isinstance(raw_timestamp, str):
+        try:
+            raw_timestamp = datetime.datetime.fromisoformat(raw_timestamp)
+        except ValueError:
+            return raw_timestamp # Deja el valor crudo si no se puede parsear
+    return raw_timestamp.strftime(TIMESTAMP_FORMAT)
+
+
+class CommandResult:
+    """
+    Resultado de interpretar un comando. La interfaz muestra 'reply' (si lo hay) y,
+    si hay datos que consultar, llama a fn(*args) donde le convenga: la ventana Qt
+    en su pool de trabajos con la clave 'job_key' y la línea de comandos directamente.
+    'watch_changed' indica que el modo de vigilancia se activó, cambió o se detuvo.
+    """
+
+    def __init__(self, reply=None, job_key=None, fn=None, args=(), watch_changed=False):
+        self.reply = reply
+        self.job_key = job_key
+        self.fn = fn
+        self.args = args
+        self.watch_changed = watch_changed
+
+
+class CommandEngine:
+    """
+    Estado y lógica del chat de métricas: lista de métricas, conexión de solo
+    lectura, cachés, host consultado y modo de vigilancia.
+    """
+    def __init__(self, db_path=DB_PATH):
+        """
+        Crea el gestor de la conexión persistente de solo lectura y lee la lista de
+        métricas del esquema. El muestreador de procesos no se arranca hasta que se
+        pide el Top 10 (o hasta que la interfaz lo arranca para tenerlo listo).
+
+        :param db_path: Ruta del archivo DuckDB.
+        """
+        # Aseguramos que el directorio 'data' exista para la BD
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+
+        # Lista de métricas por defecto; se sustituye por la leída del esquema de 'metricas'
+        self._set_metric_names(list(METRIC_FORMATS))
+
+        # Ventanas de liberación (en segundos) para que el escritor externo pueda tomar el bloqueo:
+        # - max_hold_seconds: tiempo máximo con la conexión abierta de forma continua.
+        # - release_window_seconds: pausa sin reabrir tras superar ese máximo.
+        # - idle_release_seconds: inactividad tras la cual se cierra la conexión.
+        # Cada conexión crea la vista que une la tabla viva con el archivo Parquet (archive.py).
+        self.db_reader = ReadOnlyConnectionManager(
+            db_path,
+            max_hold_seconds=5.0,
+            release_window_seconds=1.0,
+            idle_release_seconds=2.0,
+            on_connect=functools.partial(create_archive_view, archive_dir=archive_path(db_path)),
+        )
+
+        # Cachés del último registro (valores sin formatear), una por host consultado (None =
+        # cualquier host): se invalidan si cambia el archivo o expira el TTL
+        self.metrics_caches = {}
+
+        # Host al que se limitan las consultas ("host <nombre>"); None = el registro más
+        # reciente de cualquier host
+        self.current_host = None
+
+        # Esquema de 'metricas' con el que se construyó la lista de métricas
+        self._metric_schema = None
+
+        # Muestreador de procesos en segundo plano para el Top 10 de CPU
+        self.process_sampler = TopProcessSampler(interval=1.0)
+
+        # Estado del modo de vigilancia: métricas, host vigilado, última marca de tiempo
+        # vista (sin formatear), valores recientes por métrica y firma del archivo en el
+        # último sondeo
+        self.watch_metrics = []
+        self.watch_host = None
+        self.watch_last_seen = None
+        self.watch_trends = {}
+        self.watch_signature = None
+
+        # Construir la lista de métricas a partir del esquema de la tabla
+        self.refresh_metric_names()
+
+    def close(self):
+        """Detiene el muestreo de procesos y cierra la conexión de solo lectura."""
+        self.process_sampler.stop()
+        self.db_reader.close()
+
+    def _set_metric_names(self, column_names):
+        """
+        Establece la lista de métricas (columnas más la opción del Top 10 CPU) y sus
+        nombres formateados. Se asignan de una vez porque los hilos del pool pueden
+        actualizarlas mientras la interfaz las lee.
+        """
+        metric_names = list(column_names) + ["top_10_cpu"]
+        
+        # Diccionario para mapear nombres originales a nombres formateados
+        formatted_metric_names = {name: " ".join(part.capitalize() for part in name.split('_')) for name in metric_names}
+        # Sobreescribir el formato de la opción del Top 10
+        formatted_metric_names["top_10_cpu"] = "Top 10 Apps High CPU"
+
+        self.formatted_metric_names = formatted_metric_names
+        self.metric_names = metric_names
+
+    def refresh_metric_names(self):
+        """
+        Reconstruye la lista de métricas a partir de las columnas numéricas de la tabla
+        'metricas'. El esquema se lee una vez por generación del archivo, así que la
+        llamada es barata mientras no cambie; si la tabla no se puede leer, se conserva
+        la lista vigente.
+        """
+        try:
+            schema = self.db_reader.table_schema('metricas')
+        except duckdb.Error:
+            return
+        if schema is self._metric_schema:
+            return
+        columns = sorted(schema.items(), key=lambda item: item[1][0])
+        column_names = [name for name, (_, column_type) in columns
+                        if name not in NON_METRIC_COLUMNS and column_type.startswith(NUMERIC_TYPES)]
+        self._set_metric_names(column_names)
+        self._metric_schema = schema
+
+    def metrics_list_message(self):
+        """Devuelve el mensaje con la lista numerada de métricas disponibles."""
+        metrics_list_str = "Bot: Métricas disponibles:\n"
+        for i, name in enumerate(self.metric_names, 1):
+            formatted_name = self.formatted_metric_names[name]
+            metrics_list_str += f"{i}. {formatted_name}\n"
+        return metrics_list_str
+
+    # --- FUNCIONES DE DUCKDB MODIFICADAS/AÑADIDAS ---
+
+    @timed("duckdb.execute")
+    def _duckdb_execute(self, query, prepared_name=None, with_columns=False, parameters=None):
+        """
+        Ejecuta una consulta sobre la conexión persistente de solo lectura a la base
+        de datos DuckDB. El gestor reabre la conexión solo si el archivo cambió y la
+        libera periódicamente para el proceso de escritura externo.
+        
+        :param query: Consulta SQL a ejecutar.
+        :param prepared_name: Si se indica, la consulta se ejecuta como sentencia preparada con ese nombre.
+        :param with_columns: Si es True, devuelve también los nombres de columna del cursor.
+        :param parameters: Parámetros opcionales de la consulta (no se usan con prepared_name).
+        :return: Resultado de la consulta como una lista de tuplas (o una tupla (columnas, filas)
+                 si with_columns es True), o un diccionario de error.
+        """
+        try:
+            if prepared_name is not None:
+                return self.db_reader.execute_prepared(prepared_name, query)
+            if with_columns:
+                return self.db_reader.fetch(query, parameters)
+            return self.db_reader.execute(query, parameters)
+        except duckdb.Error as e:
+            # Captura errores específicos de DuckDB (ej. archivo no encontrado, tabla no existe, corrupción).
+            # No se escribe en el chat desde aquí: esta función se ejecuta en el pool de trabajos.
+            error_msg = f"Error de DuckDB al ejecutar consulta: {e}. Confirme la existencia del archivo 'monitoreo.duckdb' y la tabla 'metricas'."
+            return {'error': error_msg}
+
+    def latest_row_cache(self, host=None):
+        """Devuelve la caché del último registro de un host (o de cualquier host si es None)."""
+        cache = self.metrics_caches.get(host)
+        if cache is None:
+            cache = self.metrics_caches.setdefault(
+                host, LatestRowCache(self.db_reader, ttl_seconds=10.0, host=host))
+        return cache
+
+    @timed("get_metrics_data")
+    def get_metrics_data(self, host=None, raw=False):
+        """
+        Obtiene el último conjunto de datos de la tabla 'metricas' utilizando la
+        conexión persistente de solo lectura. El registro se guarda en caché (sin
+        formatear) hasta que cambie el archivo o expire su TTL.
+
+        :param host: Si se indica, el último registro de ese host.
+        :param raw: Si es True, devuelve los valores sin formatear (p. ej. para la API HTTP).
+        """
+        cache = self.latest_row_cache(host)
+        cached_metrics = cache.get()
+        if cached_metrics is not None:
+            return cached_metrics if raw else format_metrics(cached_metrics)
+
+        # Con la columna TIMESTAMP ordenada, max(timestamp) y el filtro de igualdad solo leen
+        # los grupos de filas cuyo rango (zone map) contiene el máximo: no hay que ordenar la tabla
+        condition, parameters = host_condition(host)
+        query = (f"SELECT * FROM metricas WHERE {condition} AND timestamp = "
+                 f"(SELECT max(timestamp) FROM metricas WHERE {condition}) LIMIT 1")
+        result_set = self._duckdb_execute(query, with_columns=True, parameters=parameters * 2)
+        
+        # Verificar si _duckdb_execute retornó un error
+        if isinstance(result_set, dict) and 'error' in result_set:
+            # Se propaga el estado de error para que lo muestre quien hizo la consulta
+            return result_set
+            
+        columns, rows = result_set
+        if not rows or not rows[0]:
+            if host is not None:
+                return unknown_host_error(host)
+            return {'error': 'No hay datos en la tabla de métricas.'}
+
+        # Crear un diccionario a partir de la fila y los nombres de columna del cursor,
+        # de modo que el mapeo sigue siendo correcto aunque el escritor añada columnas
+        metrics = dict(zip(columns, rows[0]))
+
+        # La clave de la caché es la marca de tiempo original del registro
+        cache.store(metrics, metrics.get('timestamp'))
+        return dict(metrics) if raw else format_metrics(metrics)
+    
+    @timed("get_metric_data")
+    def get_metric_data(self, metric_key, host=None, raw=False):
+        """
+        Obtiene el último valor de una sola métrica. Solo se leen las columnas
+        'timestamp' y la de la métrica, mediante una sentencia preparada por columna,
+        de modo que DuckDB no tiene que leer el resto de columnas de la tabla.
+
+        :param metric_key: Nombre de la columna.
+        :param host: Si se indica, el último valor de ese host. EXECUTE no admite
+                     parámetros enlazados, así que en ese caso se usa una consulta parametrizada.
+        :param raw: Si es True, devuelve los valores sin formatear.
+        :return: Diccionario con 'timestamp' y la métrica (formateados salvo con raw), o un
+                 diccionario de error.
+        """
+        cache = self.latest_row_cache(host)
+        cached_metrics = cache.get(columns=('timestamp', metric_key))
+        if cached_metrics is not None:
+            metrics = {key: cached_metrics[key] for key in ('timestamp', metric_key)}
+            return metrics if raw else format_metrics(metrics)
+
+        # El nombre de la columna se valida contra el esquema antes de usarlo en el SQL
+        try:
+            schema = self.db_reader.table_schema('metricas')
+        except duckdb.Error as e:
+            return {'error': f"Error de DuckDB al leer el esquema de 'metricas': {e}."}
+        if metric_key not in schema:
+            return {}
+
+        if host is None:
+            query = f'SELECT timestamp, "{metric_key}" FROM metricas WHERE timestamp = (SELECT max(timestamp) FROM metricas) LIMIT 1'
+            result_set = self._duckdb_execute(query, prepared_name=f"latest_{metric_key}")
+        else:
+            condition, parameters = host_condition(host)
+            query = (f'SELECT timestamp, "{metric_key}" FROM metricas WHERE {condition} AND timestamp = '
+                     f'(SELECT max(timestamp) FROM metricas WHERE {condition}) LIMIT 1')
+            result_set = self._duckdb_execute(query, parameters=parameters * 2)
+
+        if isinstance(result_set, dict) and 'error' in result_set:
+            return result_set
+
+        if not result_set or not result_set[0]:
+            if host is not None:
+                return unknown_host_error(host)
+            return {'error': 'No hay datos en la tabla de métricas.'}
+
+        raw_timestamp, value = result_set[0]
+        metrics = {'timestamp': raw_timestamp, metric_key: value}
+        cache.store(metrics, raw_timestamp, complete=False)
+        return metrics if raw else format_metrics(metrics)
+
+    def select_history_tier(self, metric_key, bucket_seconds):
+        """
+        Elige el nivel de agregados más grueso cuyo intervalo cabe en el intervalo del
+        historial (ver maintenance.py). Los niveles que no existen o están vacíos se omiten.
+
+        :return: Tupla (tabla, segundos por intervalo, fin del último intervalo agregado),
+                 o (None, None, None) si hay que leer las filas crudas.
+        """
+        for table, seconds, _, _ in reversed(ROLLUP_TIERS):
+            if seconds > bucket_seconds:
+                continue
+            try:
+                schema = self.db_reader.table_schema(table)
+            except duckdb.CatalogException:
+                continue
+            if f"{metric_key}_count" not in schema:
+                continue
+            last_bucket = self.db_reader.execute(f"SELECT max(bucket) FROM {table}")[0][0]
+            if last_bucket is None:
+                continue
+            return table, seconds, last_bucket + datetime.timedelta(seconds=seconds)
+        return None, None, None
+
+    @timed("fetch_metric_history")
+    def fetch_metric_history(self, metric_key, range_seconds, host=None, formatted=False):
+        """
+        Obtiene el historial reducido de una métrica en el rango pedido. La agregación
+        (mín/media/máx/p95 por intervalo con time_bucket) se hace en DuckDB, así que a
+        Python solo llegan como mucho HISTORY_MAX_POINTS filas, sea cual sea el rango.
+        Si existen agregados por minuto u hora, se lee el nivel más grueso que sirve al
+        rango pedido; en ese caso el p95 se calcula sobre las medias de sus intervalos.
+
+        :param metric_key: Nombre de la columna.
+        :param range_seconds: Duración del rango hacia atrás desde ahora.
+        :param host: Si se indica, solo las filas de ese host.
+        :param formatted: Si es True, cada fila lleva además los textos que muestra el chat,
+                          formateados por columnas en la misma consulta (ver format_sql):
+                          intervalo, mín, media, máx, p95 y el mín/media/máx de todo el rango.
+        :return: Diccionario con 'bucket_seconds', 'tier_table', 'tier_seconds' y 'rows'
+                 (bucket, mín, media, máx, p95, muestras[, textos]), o un diccionario de error.
+        """
+        try:
+            schema = self.db_reader.table_schema('metricas')
+        except duckdb.Error as e:
+            return {'error': f"Error de DuckDB al leer el esquema de 'metricas': {e}."}
+        if metric_key not in schema:
+            return {'error': "No se encontraron datos para esa métrica en la base de datos."}
+
+        bucket_seconds = history_bucket_seconds(range_seconds)
+        since = datetime.datetime.now() - datetime.timedelta(seconds=range_seconds)
+        try:
+            tier_table, tier_seconds, tier_end = self.select_history_tier(metric_key, bucket_seconds)
+        except duckdb.Error as e:
+            return {'error': f"Error de DuckDB al consultar los agregados: {e}."}
+
+        # Cada parte aporta (instante, mínimo, media, máximo, número de muestras): las filas
+        # del nivel de agregados hasta su último intervalo cerrado y, a partir de ahí, las
+        # filas crudas, que todavía no se han agregado.
+        parts = []
+        parameters = []
+        raw_since = since
+        condition, host_parameters = host_condition(host)
+        if tier_table is not None:
+            parts.append(f"""
+                SELECT bucket AS ts, "{metric_key}_min" AS lo, "{metric_key}_sum" / "{metric_key}_count" AS mean,
+                       "{metric_key}_max" AS hi, "{metric_key}_count" AS n
+                FROM {tier_table}
+                WHERE bucket >= ? AND bucket < ? AND {condition} AND "{metric_key}_count" > 0
+            """)
+            parameters += [since, tier_end] + host_parameters
+            raw_since = max(since, tier_end)
+        # Las filas crudas se leen de la vista que incluye los meses archivados en Parquet;
+        # el filtro por año y mes descarta las particiones anteriores al rango sin abrirlas
+        partition_filter, partition_parameters = archive_partition_filter(raw_since)
+        parts.append(f"""
+            SELECT CAST(timestamp AS TIMESTAMP) AS ts, "{metric_key}" AS lo, "{metric_key}" AS mean,
+                   "{metric_key}" AS hi, 1 AS n
+            FROM {ARCHIVE_VIEW}
+            WHERE CAST(timestamp AS TIMESTAMP) >= ? AND {partition_filter} AND {condition}
+                  AND "{metric_key}" IS NOT NULL
+        """)
+        parameters += [raw_since] + partition_parameters + host_parameters
+
+        parameters.append(bucket_seconds)
+
+        columns = ["bucket", "lo", "mean", "hi", "p95", "n"]
+        if formatted:
+            columns.append("strftime(bucket, ?)")
+            parameters.append("%H:%M" if range_seconds <= 86400 else "%d/%m %H:%M")
+            columns += [format_sql(column, metric_key) for column in (
+                "lo", "mean", "hi", "p95",
+                "min(lo) OVER ()", "sum(mean * n) OVER () / sum(n) OVER ()", "max(hi) OVER ()")]
+
+        query = f"""
+            WITH parts AS ({" UNION ALL ".join(parts)}),
+            buckets AS (
+                SELECT time_bucket(to_seconds(?), ts) AS bucket,
+                       min(lo) AS lo, sum(mean * n) / sum(n) AS mean, max(hi) AS hi,
+                       quantile_cont(mean, 0.95) AS p95, sum(n) AS n
+                FROM parts
+                GROUP BY bucket
+            )
+            SELECT {", ".join(columns)}
+            FROM buckets
+            ORDER BY bucket
+        """
+        try:
+            rows = self.db_reader.execute(query, parameters)
+        except duckdb.Error as e:
+            return {'error': f"Error de DuckDB al consultar el historial: {e}."}
+        return {'bucket_seconds': bucket_seconds, 'tier_table': tier_table,
+                'tier_seconds': tier_seconds, 'rows': rows}
+
+    def get_metric_history(self, metric_key, range_seconds, range_label, host=None):
+        """
+        Construye el texto del historial de una métrica (ver fetch_metric_history).
+
+        :param range_label: Rango tal como lo escribió el usuario (p. ej. "24h").
+        :return: Texto de la respuesta del bot.
+        """
+        history = self.fetch_metric_history(metric_key, range_seconds, host, formatted=True)
+        if 'error' in history:
+            return history['error']
+        rows = history['rows']
+        bucket_seconds = history['bucket_seconds']
+        tier_table, tier_seconds = history['tier_table'], history['tier_seconds']
+
+        formatted_name = self.formatted_metric_names.get(metric_key, metric_key)
+        if host is not None:
+            formatted_name += f"' en '{host}"
+        if not rows:
+            return f"No hay datos de '{formatted_name}' en las últimas {range_label}."
+
+        minimum, average, maximum = rows[0][11:14]
+        response = f"Historial de '{formatted_name}' (últimas {range_label}, intervalos de {datetime.timedelta(seconds=bucket_seconds)}):\n"
+        if tier_table is not None:
+            response += f"Fuente: agregados de {datetime.timedelta(seconds=tier_seconds)} (p95 sobre sus medias)\n"
+        response += sparkline([row[2] for row in rows]) + "\n"
+        response += f"Mín: {minimum} | Media: {average} | Máx: {maximum}\n\n"
+        response += "Intervalo: mín / media / máx / p95\n"
+        # Los textos ya vienen formateados de DuckDB: bucket y valores en las columnas 6 a 10
+        response += "".join(f"{row[6]}: {' / '.join(row[7:11])}\n" for row in rows)
+        return response
+
+    @timed("get_fleet_data")
+    def get_fleet_data(self, metric_key):
+        """
+        Obtiene el último valor de una métrica en cada host con una única consulta
+        (arg_max por hostname), sin una consulta por host. Los hosts cuya última muestra
+        tiene más de FLEET_STALE_SECONDS se listan aparte, con la hora de esa muestra, y
+        no cuentan en el resumen. El resumen de la flota y el formato de los valores y
+        las fechas (format_sql, strftime) se calculan en la misma consulta, y a Python
+        solo llegan como mucho FLEET_MAX_ROWS filas ya formateadas de cada parte.
+
+        :param metric_key: Nombre de la columna.
+        :return: Texto de la respuesta del bot.
+        """
+        try:
+            schema = self.db_reader.table_schema('metricas')
+        except duckdb.Error as e:
+            return f"Error de DuckDB al leer el esquema de 'metricas': {e}."
+        if metric_key not in schema:
+            return "No se encontraron datos para esa métrica en la base de datos."
+
+        stale_since = datetime.datetime.now() - datetime.timedelta(seconds=FLEET_STALE_SECONDS)
+        # CAST: en las bases sin migrar (ver maintenance.py) timestamp sigue siendo VARCHAR
+        query = f"""
+            WITH latest AS (
+                SELECT hostname, arg_max("{metric_key}", ts) AS value, max(ts) AS last_seen
+                FROM (SELECT hostname, "{metric_key}", CAST(timestamp AS TIMESTAMP) AS ts FROM metricas)
+                GROUP BY hostname
+            ), hosts AS (
+                SELECT *, last_seen < ? AS stale FROM latest
+            )
+            SELECT hostname, {format_sql("value", metric_key)}, strftime(last_seen, ?), stale,
+                   count(*) FILTER (WHERE NOT stale) OVER (), count(*) FILTER (WHERE stale) OVER (),
+                   {format_sql("min(value) FILTER (WHERE NOT stale) OVER ()", metric_key)},
+                   {format_sql("avg(value) FILTER (WHERE NOT stale) OVER ()", metric_key)},
+                   {format_sql("max(value) FILTER (WHERE NOT stale) OVER ()", metric_key)}
+            FROM hosts
+            QUALIFY row_number() OVER (PARTITION BY stale ORDER BY CASE WHEN stale THEN NULL ELSE value END
+                                       DESC NULLS LAST, last_seen DESC, hostname) <= ?
+            ORDER BY stale, CASE WHEN stale THEN NULL ELSE value END DESC NULLS LAST, last_seen DESC, hostname
+        """
+        try:
+            rows = self.db_reader.execute(query, [stale_since, TIMESTAMP_FORMAT, FLEET_MAX_ROWS])
+        except duckdb.Error as e:
+            return f"Error de DuckDB al consultar la flota: {e}."
+
+        formatted_name = self.formatted_metric_names.get(metric_key, metric_key)
+        if not rows:
+            return f"Ningún host ha registrado '{formatted_name}'."
+
+        host_count, stale_count, minimum, average, maximum = rows[0][4:]
+        fresh_rows = [row for row in rows if not row[3]]
+        stale_rows = [row for row in rows if row[3]]
+        window = datetime.timedelta(seconds=FLEET_STALE_SECONDS)
+        response = ""
+        if fresh_rows:
+            response += f"Flota: '{formatted_name}' en {host_count} hosts (última muestra de cada uno):\n"
+            response += f"Mín: {minimum} | Media: {average} | Máx: {maximum}\n\n"
+            for i, (hostname, value, last_seen, *_) in enumerate(fresh_rows, 1):
+                response += f"{i}. {hostname}: {value or 'N/A'} ({last_seen})\n"
+            if host_count > len(fresh_rows):
+                response += f"... y {host_count - len(fresh_rows)} hosts más.\n"
+        if stale_rows:
+            if response:
+                response += "\n"
+            response += f"Sin datos en las últimas {window} ({stale_count} hosts; último valor y última muestra):\n"
+            for hostname, value, last_seen, *_ in stale_rows:
+                response += f"- {hostname}: {value or 'N/A'} ({last_seen})\n"
+            if stale_count > len(stale_rows):
+                response += f"... y {stale_count - len(stale_rows)} hosts más.\n"
+        return response
+
+    def top_processes(self, n, field='cpu_percent', grouping='name'):
+        """
+        Devuelve los n grupos de procesos con mayor valor de 'field' según la última
+        instantánea del muestreador.
+
+        :param field: Campo de la instantánea por el que se ordena (ver PROCESS_RANKINGS).
+        :param grouping: 'name' (por nombre de proceso) o 'tree' (por aplicación, sumando los procesos hijos).
+        :return: Tupla (momento de la muestra, [(nombre, {'count', 'cpu_percent', 'rss', ...}), ...]),
+                 o None si todavía no hay muestra.
+        """
+        # El muestreador se arranca con la primera petición si la interfaz no lo hizo antes
+        self.process_sampler.start()
+        # Si aún no hay muestra (recién arrancada la aplicación), se espera a la primera
+        snapshot = self.process_sampler.snapshot(timeout=self.process_sampler.interval * 2 + 1.0,
+                                                 grouping=grouping)
+        if snapshot is None:
+            return None
+        sampled_at, aggregated_data = snapshot
+        return sampled_at, top_groups(aggregated_data, n, field)
+
+    @timed("get_top_cpu_processes")
+    def get_top_cpu_processes(self):
+        """
+        Obtiene el top 10 de procesos por consumo de CPU a partir de la última
+        instantánea del muestreador en segundo plano (TopProcessSampler), por lo
+        que responde sin bloquear. Esta función no interactúa con DuckDB.
+        """
+        try:
+            top = self.top_processes(10)
+            if top is None:
+                return "El muestreo de procesos aún no está disponible. Inténtalo de nuevo en unos segundos."
+            _, sorted_items = top
+            
+            # Construimos la cadena de respuesta con el Top 10
+            response = "Top 10 procesos con mayor consumo de CPU (Agrupado por Nombre):\n"
+            for i, (name, data) in enumerate(sorted_items[:10]):
+                # Se utiliza el consumo total del grupo
+                response += f"{i+1}. {name} - {data['cpu_percent']:.2f}% (Instancias: {data['count']})\n"
+            
+            if not sorted_items:
+                response = "No se encontraron procesos activos con consumo de CPU significativo."
+                
+            return response
+            
+        except Exception as e:
+            return f"Error al obtener la lista de procesos: {e}"
+
+    @timed("get_top_processes")
+    def get_top_processes(self, n, ranking, grouping='name'):
+        """
+        Obtiene los n grupos de procesos con mayor valor en una clasificación
+        (comando "top <n> <clasificación> [tree]"), a partir de la misma instantánea que el Top 10.
+
+        :param ranking: Clave de PROCESS_RANKINGS (cpu, rss, io_read, io_write, threads, handles).
+        :param grouping: 'name' (por nombre) o 'tree' (por aplicación).
+        """
+        field = PROCESS_RANKINGS[ranking]
+        if field not in self.process_sampler.fields:
+            return f"La clasificación '{ranking}' no está disponible en este sistema."
+        top = self.top_processes(n, field, grouping)
+        if top is None:
+            return "El muestreo de procesos aún no está disponible. Inténtalo de nuevo en unos segundos."
+        _, items = top
+        label, format_value = RANKING_LABELS[ranking]
+        grouping_label, count_label = GROUPING_LABELS[grouping]
+        if not items:
+            return f"No se encontraron procesos con {label} significativo."
+        response = f"Top {n} procesos por {label} ({grouping_label}):\n"
+        for i, (name, data) in enumerate(items, 1):
+            response += f"{i}. {name} - {format_value(data[field])} ({count_label}: {data['count']})\n"
+        return response
+
+    def parse_process_at(self, user_text):
+        """
+        Interpreta una consulta del historial de procesos ("top_10_cpu at 03:00",
+        "top 5 rss at 2026-03-01 14:30"). Sin fecha, se toma la última vez que el
+        reloj marcó esa hora (hoy o, si aún no ha llegado, ayer).
+
+        :return: CommandResult, o None si el texto no es una consulta de este tipo.
+        """
+        match = PROCESS_AT_PATTERN.match(user_text)
+        if not match:
+            return None
+        command = match.group('command')
+        top_match = TOP_PATTERN.match(command)
+        if command == "top_10_cpu":
+            n, ranking = 10, 'cpu'
+        elif top_match and not top_match.group('grouping') and (top_match.group('ranking') or 'cpu') in PROCESS_SAMPLE_COLUMNS:
+            n, ranking = int(top_match.group('n')), top_match.group('ranking') or 'cpu'
+        else:
+            return CommandResult(reply="El historial de procesos admite 'top_10_cpu at HH:MM' o "
+                                       "'top <n> <cpu|rss> at [AAAA-MM-DD] HH:MM'.")
+        if not 1 <= n <= TOP_MAX_PROCESSES:
+            return CommandResult(reply=f"El número de procesos debe estar entre 1 y {TOP_MAX_PROCESSES}.")
+
+        now = datetime.datetime.now()
+        try:
+            day = datetime.date.fromisoformat(match.group('date')) if match.group('date') else now.date()
+            moment = datetime.datetime.combine(day, datetime.time(int(match.group('hour')), int(match.group('minute'))))
+        except ValueError:
+            return CommandResult(reply="Fecha u hora no válida. Usa el formato AAAA-MM-DD HH:MM.")
+        if not match.group('date') and moment > now:
+            moment -= datetime.timedelta(days=1)
+        return CommandResult(job_key=f"process_history:{ranking}", fn=self.get_process_history,
+                             args=(n, ranking, moment, self.current_host))
+
+    @timed("get_process_history")
+    def get_process_history(self, n, ranking, moment, host=None):
+        """
+        Resume las muestras de 'process_samples' del minuto que empieza en 'moment': el
+        consumo de CPU de cada grupo se promedia sobre todas las muestras del intervalo
+        (un grupo que no entró en el top de una muestra cuenta como 0 en ella) y la
+        memoria, sobre las muestras en que aparece. El recolector guarda en cada muestra
+        el top-K por CPU y el top-K por memoria, así que las dos clasificaciones ordenan
+        sobre sus propios grupos; como en la vista en vivo (top_groups), los grupos sin
+        consumo no se listan. Es una única consulta por rango de
+        tiempo; como el recolector inserta en orden cronológico, los zone maps de la
+        columna 'timestamp' limitan la lectura a los grupos de filas del intervalo.
+
+        :param ranking: 'cpu' o 'rss' (ver PROCESS_SAMPLE_COLUMNS).
+        :return: Texto de la respuesta del bot.
+        """
+        order_column = PROCESS_SAMPLE_COLUMNS[ranking]
+        condition, parameters = host_condition(host)
+        end = moment + datetime.timedelta(seconds=PROCESS_HISTORY_WINDOW_SECONDS)
+        query = f"""
+            WITH ventana AS (
+                SELECT timestamp, hostname, name, pid_count, cpu_percent, rss
+                FROM process_samples
+                WHERE timestamp >= ? AND timestamp < ? AND {condition}
+            ),
+            muestras AS (
+                SELECT hostname, count(DISTINCT timestamp) AS samples FROM ventana GROUP BY hostname
+            )
+            SELECT v.hostname, v.name, sum(v.cpu_percent) / m.samples AS cpu_percent,
+                   avg(v.rss) AS rss, max(v.pid_count), m.samples
+            FROM ventana v JOIN muestras m USING (hostname)
+            GROUP BY v.hostname, v.name, m.samples
+            HAVING {order_column} > 0
+            ORDER BY {order_column} DESC
+            LIMIT ?
+        """
+        try:
+            rows = self.db_reader.execute(query, [moment, end] + parameters + [n])
+        except duckdb.CatalogException:
+            return ("Todavía no hay historial de procesos. El recolector (--collect) guarda "
+                    "muestras en la tabla 'process_samples'.")
+        except duckdb.Error as e:
+            return f"Error de DuckDB al consultar el historial de procesos: {e}."
+
+        when = moment.strftime('%H:%M %d/%m/%Y')
+        if not rows:
+            scope = f" en '{host}'" if host else ""
+            return f"No hay muestras de procesos{scope} a las {when}."
+        label, format_value = RANKING_LABELS[ranking]
+        multiple_hosts = len({row[0] for row in rows}) > 1
+        response = (f"Top {n} procesos por {label} a las {when} "
+                    f"(media de {rows[0][5]} muestras en {PROCESS_HISTORY_WINDOW_SECONDS} s):\n")
+        for i, (hostname, name, cpu, rss, pid_count, _) in enumerate(rows, 1):
+            value = format_value(cpu if ranking == 'cpu' else int(rss or 0))
+            where = f" en {hostname}" if multiple_hosts else ""
+            response += f"{i}. {name}{where} - {value} (Instancias: {pid_count})\n"
+        return response
+
+    def execute(self, text):
+        """
+        Interpreta un comando del usuario. Las respuestas que requieren DuckDB o psutil
+        no se calculan aquí: se devuelven como función a llamar en el CommandResult.
+
+        :param text: Texto escrito por el usuario.
+        :return: CommandResult con la respuesta inmediata y/o el trabajo pendiente.
+        """
+        user_text = text.strip().lower()
+        if not user_text:
+            return CommandResult()
+
+        # Si el usuario escribe "opciones", mostrar la lista de métricas
+        if user_text == "opciones":
+            return CommandResult(reply=self.metrics_list_message())
+
+        # Percentiles de los tiempos registrados por spans.py: "stats" / "stats reset"
+        if user_text == "stats":
+            return CommandResult(reply=recorder.report())
+        if user_text == "stats reset":
+            recorder.reset()
+            return CommandResult(reply="Se han borrado los tiempos registrados.")
+
+        # Modo de vigilancia: "watch cpu_percent,ram_percent" / "watch off"
+        if user_text == "unwatch" or user_text.startswith("watch"):
+            return self.handle_watch_command(user_text)
+
+        # Ámbito de las consultas: "host <nombre>" / "host all"
+        if user_text == "host" or user_text.startswith("host "):
+            return self.handle_host_command(user_text)
+
+        # Historial de procesos guardado por el recolector: "top_10_cpu at 03:00"
+        process_at = self.parse_process_at(user_text)
+        if process_at is not None:
+            return process_at
+
+        # Clasificación de procesos: "top 5 rss", "top 20" (por CPU), "top 5 cpu tree" (por aplicación)
+        top_match = TOP_PATTERN.match(user_text)
+        if top_match:
+            n = int(top_match.group('n'))
+            ranking = top_match.group('ranking') or 'cpu'
+            grouping = top_match.group('grouping') or 'name'
+            if ranking not in PROCESS_RANKINGS or not 1 <= n <= TOP_MAX_PROCESSES:
+                return CommandResult(reply=f"Uso: top <1-{TOP_MAX_PROCESSES}> [{'|'.join(PROCESS_RANKINGS)}] [tree], "
+                                           f"p. ej. 'top 5 rss' o 'top 5 cpu tree'.")
+            return CommandResult(job_key=f"top:{ranking}:{grouping}", fn=self.get_top_processes,
+                                 args=(n, ranking, grouping))
+
+        # Último valor de una métrica en cada host: "fleet cpu_percent"
+        if user_text.startswith("fleet "):
+            metric_key = user_text[len("fleet "):].strip().replace(' ', '_')
+            if metric_key not in self.metric_names or metric_key == "top_10_cpu":
+                return CommandResult(reply=f"No se puede consultar '{metric_key}' en la flota. Escribe 'opciones' para ver la lista.")
+            return CommandResult(job_key=f"fleet:{metric_key}", fn=self.get_fleet_data, args=(metric_key,))
+
+        # Consultas de historial: "<métrica> <rango>", p. ej. "cpu_percent 1h"
+        history_match = HISTORY_PATTERN.match(user_text)
+        if history_match:
+            metric_key = history_match.group('metric').replace(' ', '_')
+            if metric_key in self.metric_names and metric_key != "top_10_cpu":
+                amount, unit = int(history_match.group('amount')), history_match.group('unit')
+                range_label = f"{amount}{unit}"
+                return CommandResult(job_key=f"history:{metric_key}:{range_label}", fn=self.get_metric_history,
+                                     args=(metric_key, amount * RANGE_UNITS[unit], range_label, self.current_host))
+
+        # Intentar convertir la entrada del usuario a un índice si es un número
+        metric_key = None
+        try:
+            num_input = int(user_text)
+            if 1 <= num_input <= len(self.metric_names):
+                metric_key = self.metric_names[num_input - 1]
+            else:
+                return CommandResult(reply=f"Número de métrica fuera de rango. Por favor, elige un número del 1 al {len(self.metric_names)} o escribe 'opciones'.")
+        except ValueError:
+            # Si no es un número, se normaliza la entrada del usuario para buscarla como nombre
+            metric_key = user_text.replace(' ', '_')
+
+        if metric_key in self.metric_names:
+            # Una nueva petición de la misma métrica reemplaza a la anterior si aún no ha terminado
+            return CommandResult(job_key=metric_key, fn=self.build_metric_response,
+                                 args=(metric_key, self.current_host))
+
+        # Métrica no válida, ni por número ni por nombre
+        return CommandResult(reply="Métrica no válida. Por favor, escribe el número o nombre exacto de la métrica.\n\n"
+                                   + self.metrics_list_message())
+
+    def build_metric_response(self, metric_key, host=None):
+        """
+        Construye el texto de respuesta para una métrica. La ventana lo ejecuta en su
+        pool de trabajos, por lo que no debe tocar ninguna interfaz.
+
+        :param metric_key: Nombre normalizado de la métrica solicitada.
+        :param host: Si se indica, el último valor de ese host.
+        :return: Texto de la respuesta del bot.
+        """
+        # Verificamos si la métrica solicitada es la del Top 10 CPU
+        if metric_key == "top_10_cpu":
+            return self.get_top_cpu_processes()
+
+        # Se actualiza la lista de métricas si el esquema cambió (una vez por generación)
+        self.refresh_metric_names()
+
+        # Solo se consulta la columna de la métrica pedida (más la marca de tiempo)
+        metrics = self.get_metric_data(metric_key, host)
+        
+        # Si se encuentra un error en la lectura de DuckDB, se responde con él
+        if 'error' in metrics:
+            return metrics['error']
+
+        if metric_key not in metrics:
+            # Este caso maneja si la métrica no está en los datos de la BD, aunque su nombre sea válido
+            return "No se encontraron datos para esa métrica en la base de datos."
+
+        formatted_name = self.formatted_metric_names.get(metric_key, metric_key)
+        if host is not None:
+            formatted_name += f"' en '{host}"
+        
+        # get_metric_data ya devuelve el valor y la marca de tiempo formateados
+        metric_value = metrics[metric_key]
+        formatted_timestamp = metrics.get('timestamp', 'Desconocida')
+        
+        # Comprobación de seguridad para los casos en que get_metric_data devuelve None o N/A
+        if metric_value is None or metric_value == "N/A":
+            return f"El valor de '{formatted_name}' no está disponible o no se pudo procesar."
+        return f"El valor de '{formatted_name}' es: {metric_value} (Última actualización: {formatted_timestamp})"
+
+    def handle_host_command(self, user_text):
+        """
+        Limita las consultas de métricas, historial y vigilancia a un host: "host <nombre>".
+        "host all" (o "host *") vuelve al registro más reciente de cualquier host y
+        "host" a secas muestra el ámbito actual.
+        """
+        argument = user_text[len("host"):].strip()
+        if not argument:
+            scope = f"al host '{self.current_host}'" if self.current_host else "a todos los hosts"
+            return CommandResult(reply=f"Las consultas se refieren {scope}. Usa 'host <nombre>' o 'host all' para cambiarlo.")
+        self.current_host = None if argument in ("all", "*") else argument
+        watch_changed = bool(self.watch_metrics)
+        if watch_changed:
+            # Las tendencias del modo de vigilancia pasan a ser las del nuevo ámbito
+            self.start_watch(self.watch_metrics)
+        if self.current_host is None:
+            reply = "Las consultas vuelven a referirse a todos los hosts."
+        else:
+            reply = f"Las consultas se limitan ahora al host '{self.current_host}'. Escribe 'host all' para volver a todos."
+        return CommandResult(reply=reply, watch_changed=watch_changed)
+
+    def handle_watch_command(self, user_text):
+        """
+        Activa o desactiva el modo de vigilancia. Las métricas se separan por comas
+        (o por espacios si no hay comas); "watch off" o "unwatch" lo detiene.
+        """
+        argument = user_text[len("watch"):].strip() if user_text.startswith("watch") else "off"
+        if not argument:
+            return CommandResult(reply="Indica las métricas a vigilar, por ejemplo: watch cpu_percent,ram_percent")
+        if argument in ("off", "stop"):
+            if not self.watch_metrics:
+                return CommandResult(reply="El modo de vigilancia no está activo.")
+            self.stop_watch()
+            return CommandResult(reply="Modo de vigilancia desactivado.", watch_changed=True)
+
+        parts = argument.split(',') if ',' in argument else argument.split()
+        metric_keys = [part.strip().replace(' ', '_') for part in parts if part.strip()]
+        invalid = [key for key in metric_keys if key not in self.metric_names or key == "top_10_cpu"]
+        if invalid:
+            return CommandResult(reply=f"No se pueden vigilar estas métricas: {', '.join(invalid)}. Escribe 'opciones' para ver la lista.")
+
+        self.start_watch(metric_keys)
+        names = ", ".join(self.formatted_metric_names[key] for key in self.watch_metrics)
+        reply = f"Modo de vigilancia activado para: {names}. Escribe 'watch off' para detenerlo."
+        if self.current_host is None:
+            reply += " Sin host seleccionado se vigila el de la muestra más reciente ('host <nombre>' para elegirlo)."
+        return CommandResult(reply=reply, watch_changed=True)
+
+    def start_watch(self, metric_keys):
+        """
+        Empieza (o reinicia) la vigilancia de unas métricas con las tendencias vacías.
+        Se vigila siempre un solo host: el del ámbito actual o, si no hay ninguno, el
+        de la muestra más reciente, que se fija al recibir las primeras filas.
+        """
+        self.watch_metrics = list(dict.fromkeys(metric_keys))
+        self.watch_host = self.current_host
+        self.watch_trends = {key: deque(maxlen=WATCH_TREND_POINTS) for key in self.watch_metrics}
+        self.watch_last_seen = None
+        self.watch_signature = None
+
+    def stop_watch(self):
+        """Detiene la vigilancia y descarta sus tendencias."""
+        self.watch_metrics = []
+        self.watch_host = None
+        self.watch_last_seen = None
+        self.watch_trends = {}
+        self.watch_signature = None
+
+    def watch_poll_due(self):
+        """
+        Indica si hay que consultar filas nuevas: hay vigilancia activa y el archivo
+        cambió desde el último sondeo. Solo se consulta la firma del archivo (sin tomar
+        el candado de la conexión, que puede estar ocupado por otro trabajo), así que se
+        puede llamar desde el hilo de la interfaz sin bloquearla.
+        """
+        if not self.watch_metrics:
+            return False
+        signature = self.db_reader.file_signature()
+        if signature == self.watch_signature:
+            return False
+        self.watch_signature = signature
+        return True
+
+    def watch_arguments(self):
+        """Devuelve los argumentos de fetch_watch_rows para el estado actual de la vigilancia."""
+        return list(self.watch_metrics), self.watch_last_seen, self.watch_host
+
+    def fetch_watch_rows(self, metric_keys, last_seen, host=None):
+        """
+        Lee las filas nuevas de las métricas vigiladas. La ventana lo ejecuta en su pool de trabajos.
+
+        :param metric_keys: Columnas vigiladas.
+        :param last_seen: Marca de tiempo (sin formatear) de la última fila recibida, o None.
+        :param host: Host vigilado. Si es None, el de la muestra más reciente: las filas
+                     de varios hosts no se mezclan en una misma tendencia.
+        :return: Lista de filas (timestamp, hostname, valores...) en orden cronológico, o un
+                 diccionario de error.
+        """
+        columns = ", ".join(f'"{key}"' for key in metric_keys)
+        if host is None:
+            condition, parameters = ("hostname = (SELECT hostname FROM metricas WHERE hostname IS NOT NULL "
+                                     "ORDER BY timestamp DESC LIMIT 1)"), []
+        else:
+            condition, parameters = host_condition(host)
+        if last_seen is None:
+            query = f"SELECT timestamp, hostname, {columns} FROM metricas WHERE {condition} ORDER BY timestamp DESC LIMIT ?"
+            parameters = parameters + [WATCH_TREND_POINTS]
+        else:
+            # Solo cruzan la frontera de DuckDB las filas nuevas (como mucho las que caben en la tendencia)
+            query = (f"SELECT timestamp, hostname, {columns} FROM metricas WHERE {condition} AND timestamp > ? "
+                     f"ORDER BY timestamp DESC LIMIT ?")
+            parameters = parameters + [last_seen, WATCH_TREND_POINTS]
+        try:
+            rows = self.db_reader.execute(query, parameters)
+        except duckdb.Error as e:
+            return {'error': f"Error de DuckDB en el modo de vigilancia: {e}."}
+        rows.reverse()
+        return rows
+
+    def apply_watch_rows(self, rows):
+        """
+        Incorpora las filas nuevas a las tendencias y compone el texto del panel de vigilancia.
+
+        :param rows: Resultado de fetch_watch_rows (filas o diccionario de error).
+        :return: Texto del panel, o None si todavía no hay ninguna muestra que mostrar.
+        """
+        if isinstance(rows, dict):
+            # Se reintenta en el siguiente sondeo aunque el archivo no cambie
+            self.watch_signature = None
+            return rows['error']
+        if rows:
+            if self.watch_host is None:
+                # Sin host elegido se fija el de la muestra más reciente, para que el cursor
+                # por marca de tiempo no salte filas de otro host con la misma marca
+                self.watch_host = rows[-1][1]
+            self.watch_last_seen = rows[-1][0]
+            for row in rows:
+                for key, value in zip(self.watch_metrics, row[2:]):
+                    if value is not None:
+                        self.watch_trends[key].append(value)
+        elif self.watch_last_seen is None:
+            return None
+
+        scope = f" '{self.watch_host}'" if self.watch_host else ""
+        lines = [f"Vigilando{scope} (última muestra: {format_timestamp(self.watch_last_seen)}):"]
+        for key in self.watch_metrics:
+            trend = self.watch_trends[key]
+            value = safe_format(trend[-1], key) if trend else "N/A"
+            line = f"{self.formatted_metric_names[key]}: {value}"
+            if len(trend) > 1:
+                line += f"  {sparkline(trend)}"
+            lines.append(line)
+        return "\n".join(lines)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+# Título: API HTTP/JSON local de consulta de métricas (asyncio)
+
+"""
+Este módulo contiene un servidor HTTP mínimo, basado en asyncio y sin
+dependencias externas, para que otras herramientas obtengan las mismas métricas
+que muestra el chat. Se ejecuta con:
+
+    python chat_app.py --serve [--port 8765] [--bind 127.0.0.1]
+
+Endpoints (solo GET, respuestas JSON):
+
+    /metrics/latest[?host=<nombre>]             último registro completo
+    /metrics/<nombre>[?range=1h][&host=...]     último valor, o historial reducido con range
+    /processes/top[?n=10][&by=cpu][&group=name] procesos con mayor consumo (cpu, rss, io_read, ...),
+                                                agrupados por nombre o por aplicación (group=tree)
+
+Todas las peticiones comparten un único CommandEngine: la misma conexión de solo
+lectura (que se sigue liberando periódicamente para el escritor), las cachés del
+último registro y el muestreador de procesos en segundo plano. Así muchos
+clientes concurrentes se sirven desde una conexión ya abierta, en lugar de que
+cada herramienta abra el archivo .duckdb por su cuenta. Las consultas, que
+bloquean, se ejecutan en un pool de hilos para no detener el bucle de eventos;
+las conexiones HTTP/1.1 se mantienen abiertas entre peticiones (keep-alive).
+"""
+
+import asyncio
+import datetime
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from command_engine import CommandEngine, RANGE_UNITS
+from process_monitor import PROCESS_GROUPINGS, PROCESS_RANKINGS
+
+# Dirección y puerto por defecto: solo accesible desde el propio equipo
+DEFAULT_BIND = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Segundos que una conexión keep-alive puede esperar a la siguiente petición
+KEEPALIVE_TIMEOUT = 15.0
+
+# Rango de historial: "<cantidad><unidad>", p. ej. "1h" o "7d"
+RANGE_PATTERN = re.compile(r"^(?P<amount>\d+)(?P<unit>[smhdw])$")
+
+# Máximo de procesos que se pueden pedir en /processes/top
+MAX_TOP_PROCESSES = 1000
+
+
+def json_default(value):
+    """Serializa los tipos que json no conoce (marcas de tiempo de DuckDB)."""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def error_response(result):
+    """
+    Traduce un diccionario de error del motor a una respuesta: 404 si el host pedido
+    no tiene filas y 503 si la base de datos no está disponible.
+    """
+    status = HTTPStatus.NOT_FOUND if result.get('not_found') else HTTPStatus.SERVICE_UNAVAILABLE
+    return status, {'error': result['error']}
+
+
+class MetricsHTTPServer:
+    """
+    Servidor HTTP/JSON que responde con los datos de un CommandEngine compartido.
+    """
+
+    def __init__(self, engine, bind=DEFAULT_BIND, port=DEFAULT_PORT, max_workers=4):
+        """
+        :param engine: Motor de comandos (CommandEngine) cuyos datos se sirven.
+        :param bind: Dirección en la que se escucha.
+        :param port: Puerto en el que se escucha.
+        :param max_workers: Hilos para las consultas; la conexión de DuckDB es única, así que
+                            basta con pocos (el resto de peticiones espera sin bloquear el bucle).
+        """
+        self.engine = engine
+        self.bind = bind
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="http-api")
+
+    async def serve_forever(self):
+        """Acepta conexiones hasta que se cancela la tarea (Ctrl+C)."""
+        server = await asyncio.start_server(self.handle_client, self.bind, self.port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        """Atiende las peticiones de una conexión, manteniéndola abierta mientras el cliente quiera."""
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                # Las peticiones GET no llevan cuerpo; si lo hay, se descarta
+                if headers.get("content-length", "0").isdigit():
+                    await reader.readexactly(int(headers.get("content-length", "0")))
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    status, payload = HTTPStatus.BAD_REQUEST, {'error': "Petición mal formada."}
+                    version = "HTTP/1.0"
+                else:
+                    method, target, version = parts
+                    status, payload = await self.dispatch(method, target)
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    def write_response(self, writer, status, payload, keep_alive):
+        """Escribe una respuesta JSON completa en el flujo de la conexión."""
+        body = json.dumps(payload, default=json_default, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+
+    async def dispatch(self, method, target):
+        """
+        Resuelve una petición. La consulta se ejecuta en el pool de hilos.
+
+        :return: Tupla (HTTPStatus, objeto serializable a JSON).
+        """
+        if method != "GET":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': "Solo se admite GET."}
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        path = [segment for segment in url.path.split("/") if segment]
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, self.route, path, query)
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"Error inesperado: {e}"}
+
+    def route(self, path, query):
+        """Llama al manejador del endpoint (en un hilo del pool)."""
+        if path == ["metrics", "latest"]:
+            return self.latest_metrics(query.get("host"))
+        if len(path) == 2 and path[0] == "metrics":
+            return self.metric(path[1], query.get("range"), query.get("host"))
+        if path == ["processes", "top"]:
+            return self.top_processes(query.get("n", "10"), query.get("by", "cpu"), query.get("group", "name"))
+        return HTTPStatus.NOT_FOUND, {'error': "Endpoint no encontrado."}
+
+    def latest_metrics(self, host):
+        """/metrics/latest: último registro completo (valores sin formatear)."""
+        metrics = self.engine.get_metrics_data(host, raw=True)
+        if 'error' in metrics:
+            return error_response(metrics)
+        return HTTPStatus.OK, metrics
+
+    def metric(self, metric_key, range_label, host):
+        """/metrics/<nombre>: último valor de una métrica o, con range, su historial reducido."""
+        # Se actualiza la lista de métricas si el esquema cambió (una vez por generación)
+        self.engine.refresh_metric_names()
+        if metric_key not in self.engine.metric_names or metric_key == "top_10_cpu":
+            return HTTPStatus.NOT_FOUND, {'error': f"Métrica desconocida: '{metric_key}'."}
+
+        if range_label is None:
+            metrics = self.engine.get_metric_data(metric_key, host, raw=True)
+            if 'error' in metrics:
+                return error_response(metrics)
+            if 'timestamp' not in metrics or metric_key not in metrics:
+                # get_metric_data devuelve {} si la columna ya no está en el esquema
+                return HTTPStatus.NOT_FOUND, {'error': f"La métrica '{metric_key}' no está en la tabla de métricas."}
+            return HTTPStatus.OK, {'metric': metric_key, 'host': host,
+                                   'timestamp': metrics['timestamp'], 'value': metrics[metric_key]}
+
+        match = RANGE_PATTERN.match(range_label)
+        if not match:
+            return HTTPStatus.BAD_REQUEST, {'error': "Rango no válido; use p. ej. range=30m, 1h o 7d."}
+        range_seconds = int(match.group('amount')) * RANGE_UNITS[match.group('unit')]
+        history = self.engine.fetch_metric_history(metric_key, range_seconds, host)
+        if 'error' in history:
+            return HTTPStatus.SERVICE_UNAVAILABLE, history
+        points = [
+            {'bucket': bucket, 'min': minimum, 'avg': average, 'max': maximum, 'p95': p95, 'count': count}
+            for bucket, minimum, average, maximum, p95, count in history['rows']
+        ]
+        return HTTPStatus.OK, {'metric': metric_key, 'host': host, 'range': range_label,
+                               'bucket_seconds': history['bucket_seconds'],
+                               'source': history['tier_table'] or 'metricas', 'points': points}
+
+    def top_processes(self, n, ranking, grouping):
+        """/processes/top: grupos de procesos (por nombre o por aplicación) con mayor consumo según 'by'."""
+        if not n.isdigit() or not 1 <= int(n) <= MAX_TOP_PROCESSES:
+            return HTTPStatus.BAD_REQUEST, {'error': f"n debe ser un entero entre 1 y {MAX_TOP_PROCESSES}."}
+        field = PROCESS_RANKINGS.get(ranking)
+        if field is None or field not in self.engine.process_sampler.fields:
+            available = [name for name, field in PROCESS_RANKINGS.items() if field in self.engine.process_sampler.fields]
+            return HTTPStatus.BAD_REQUEST, {'error': f"by debe ser uno de: {', '.join(available)}."}
+        if grouping not in PROCESS_GROUPINGS:
+            return HTTPStatus.BAD_REQUEST, {'error': f"group debe ser uno de: {', '.join(PROCESS_GROUPINGS)}."}
+        top = self.engine.top_processes(int(n), field, grouping)
+        if top is None:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {'error': "El muestreo de procesos aún no está disponible."}
+        sampled_at, items = top
+        processes = [{'name': name, **data} for name, data in items]
+        return HTTPStatus.OK, {'sampled_at': datetime.datetime.fromtimestamp(sampled_at),
+                               'by': ranking, 'group': grouping, 'processes': processes}
+
+
+def run_server(db_path, bind=DEFAULT_BIND, port=DEFAULT_PORT):
+    """Arranca la API HTTP (opción --serve) hasta Ctrl+C."""
+    engine = CommandEngine(db_path)
+    # El muestreador empieza ya para que /processes/top tenga una muestra lista
+    engine.process_sampler.start()
+    server = MetricsHTTPServer(engine, bind=bind, port=port)
+    print(f"API de métricas en http://{bind}:{port}/ (base de datos: '{db_path}'). Ctrl+C para detener.")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown(wait=True)
+        engine.close()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Título: Despachador de trabajos en segundo plano para la interfaz Qt
+
+"""
+Este módulo contiene el despachador que ejecuta las consultas a DuckDB y los
+recorridos de procesos fuera del hilo de la interfaz gráfica, usando
+QThreadPool y QRunnable. Los resultados vuelven al hilo de la interfaz mediante
+señales, por lo que la ventana nunca se bloquea mientras una consulta tarda.
+
+Cada trabajo se registra con una clave (por ejemplo, el nombre de la métrica).
+Se pueden tener varios trabajos en curso a la vez, pero si llega uno nuevo con
+la misma clave, el anterior se da por reemplazado: se retira de la cola si aún
+no había empezado y, si ya estaba ejecutándose, su resultado se descarta.
+"""
+
+import itertools
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class JobSignals(QObject):
+    """Señales que un trabajo emite desde el hilo del pool."""
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+
+class Job(QRunnable):
+    """Trabajo ejecutable en el QThreadPool que llama a una función con sus argumentos."""
+
+    def __init__(self, job_id, fn, args):
+        super().__init__()
+        # El despachador conserva la referencia hasta recibir el resultado
+        self.setAutoDelete(False)
+        self.job_id = job_id
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+        self.signals = JobSignals()
+
+    def run(self):
+        """Ejecuta la función (salvo que el trabajo se haya cancelado) y emite el resultado."""
+        if self.cancelled:
+            # Se avisa igualmente para que el despachador suelte su referencia
+            self.signals.finished.emit(self.job_id, None)
+            return
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, str(e))
+            return
+        self.signals.finished.emit(self.job_id, result)
+
+
+class JobDispatcher(QObject):
+    """
+    Envía trabajos al QThreadPool y reenvía sus resultados al hilo de la interfaz.
+    """
+    job_finished = pyqtSignal(int, object)
+    job_failed = pyqtSignal(int, str)
+    job_cancelled = pyqtSignal(int)
+
+    def __init__(self, parent=None, max_threads=None):
+        """
+        :param parent: Objeto Qt padre.
+        :param max_threads: Número máximo de hilos del pool (por defecto, el de Qt).
+        """
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        if max_threads is not None:
+            self.pool.setMaxThreadCount(max_threads)
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._keys = {}
+        self._active_by_key = {}
+        # Trabajos cancelados que siguen ejecutándose: se conservan hasta que terminan
+        self._retired = {}
+
+    def submit(self, key, fn, *args):
+        """
+        Encola un trabajo. Si ya hay uno en curso con la misma clave, se cancela.
+
+        :param key: Clave que identifica trabajos equivalentes.
+        :param fn: Función a ejecutar en el pool; no debe tocar la interfaz.
+        :return: Identificador del trabajo.
+        """
+        previous_id = self._active_by_key.get(key)
+        if previous_id is not None:
+            self.cancel(previous_id)
+
+        job_id = next(self._ids)
+        job = Job(job_id, fn, args)
+        job.signals.finished.connect(self._on_finished)
+        job.signals.failed.connect(self._on_failed)
+        self._jobs[job_id] = job
+        self._keys[job_id] = key
+        self._active_by_key[key] = job_id
+        self.pool.start(job)
+        return job_id
+
+    def cancel(self, job_id):
+        """Cancela un trabajo pendiente o descarta el resultado de uno en ejecución."""
+        job = self._forget(job_id)
+        if job is None:
+            return
+        job.cancelled = True
+        if not self.pool.tryTake(job):
+            self._retired[job_id] = job
+        self.job_cancelled.emit(job_id)
+
+    def shutdown(self, timeout_ms=2000):
+        """Cancela los trabajos pendientes y espera a que terminen los que están en curso."""
+        for job_id in list(self._jobs):
+            self.cancel(job_id)
+        self.pool.clear()
+        self.pool.waitForDone(timeout_ms)
+
+    def _forget(self, job_id):
+        """Retira un trabajo del registro y devuelve su instancia (o None si ya no estaba)."""
+        job = self._jobs.pop(job_id, None)
+        key = self._keys.pop(job_id, None)
+        if self._active_by_key.get(key) == job_id:
+            del self._active_by_key[key]
+        return job
+
+    def _on_finished(self, job_id, result):
+        """Reenvía el resultado si el trabajo no fue reemplazado ni cancelado."""
+        self._retired.pop(job_id, None)
+        if self._forget(job_id) is not None:
+            self.job_finished.emit(job_id, result)
+
+    def _on_failed(self, job_id, message):
+        """Reenvía el error si el trabajo no fue reemplazado ni cancelado."""
+        self._retired.pop(job_id, None)
+        if self._forget(job_id) is not None:
+            self.job_failed.emit(job_id, message)
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# Título: Mantenimiento de la tabla 'metricas' (agregados por minuto y por hora, retención)
+
+"""
+Este módulo contiene el trabajo de mantenimiento que evita que la tabla
+'metricas' crezca sin límite. Se ejecuta desde el recolector (periódicamente,
+dentro de su ventana de escritura) o a mano con:
+
+    python chat_app.py --maintain
+
+El mantenimiento:
+1. Agrega las filas crudas en intervalos cerrados de un minuto ('metricas_1m') y
+   estos, a su vez, en intervalos de una hora ('metricas_1h'). Cada nivel guarda
+   por métrica el mínimo, el máximo, la suma y el número de muestras, de modo
+   que los niveles superiores y las consultas de historial pueden reagregarlos
+   sin perder exactitud en mínimos, máximos y medias.
+2. Borra las filas de cada nivel más antiguas que su ventana de retención, pero
+   solo cuando ya están incluidas en el nivel siguiente. Las filas crudas se
+   exportan antes al archivo Parquet particionado (ver archive.py); si la
+   exportación falla, esas filas no se borran y el resto del mantenimiento sigue.
+   Las muestras de procesos ('process_samples') se borran pasados
+   PROCESS_SAMPLES_RETENTION_DAYS.
+
+Antes de empezar, migra a TIMESTAMP la columna 'timestamp' de las bases de datos
+creadas cuando se guardaba como texto ISO (ver migrate_timestamp_column).
+
+Solo se agregan intervalos que terminaron hace más de ROLLUP_DELAY_SECONDS, para
+dar margen a las filas que el recolector aún tiene en su búfer.
+"""
+
+import datetime
+import os
+
+import duckdb
+
+from archive import ArchiveError, archive_path, export_archive
+from metrics_db import METRICAS_SCHEMA
+
+# Columnas de 'metricas' que se agregan (todas las numéricas)
+ROLLUP_METRICS = [name for name, column_type in METRICAS_SCHEMA if column_type == "DOUBLE"]
+
+# Niveles de agregación: (tabla, segundos por intervalo, tabla de origen, días de retención del nivel)
+ROLLUP_TIERS = [
+    ("metricas_1m", 60, "metricas", 90),
+    ("metricas_1h", 3600, "metricas_1m", None),
+]
+
+# Días que se conservan las filas crudas de 'metricas'
+RAW_RETENTION_DAYS = 7
+
+# Días que se conservan las muestras de procesos de 'process_samples'
+PROCESS_SAMPLES_RETENTION_DAYS = 30
+
+# Margen para las filas que llegan con retraso antes de cerrar un intervalo
+ROLLUP_DELAY_SECONDS = 300
+
+
+def floor_time(moment, seconds):
+    """Redondea un instante hacia abajo al inicio de su intervalo (seconds debe dividir un día)."""
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    offset = (moment - midnight).total_seconds()
+    return midnight + datetime.timedelta(seconds=offset - offset % seconds)
+
+
+def migrate_timestamp_column(conn):
+    """
+    Convierte la columna 'timestamp' de 'metricas' de texto ISO (bases de datos
+    anteriores) a TIMESTAMP. La tabla se reconstruye ordenada por tiempo para que
+    los mínimos y máximos por grupo de filas (zone maps) permitan a DuckDB saltarse
+    todo salvo el final de la tabla al buscar el último registro; como el
+    recolector inserta en orden cronológico, el orden se mantiene después.
+
+    :return: True si se migró la tabla.
+    """
+    column_type = conn.execute(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_name = 'metricas' AND column_name = 'timestamp'"
+    ).fetchone()
+    if column_type is None or column_type[0] != "VARCHAR":
+        return False
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.execute("""
+            CREATE TABLE metricas_migracion AS
+            SELECT * REPLACE (TRY_CAST(timestamp AS TIMESTAMP) AS timestamp)
+            FROM metricas
+            ORDER BY timestamp
+        """)
+        conn.execute("DROP TABLE metricas")
+        conn.execute("ALTER TABLE metricas_migracion RENAME TO metricas")
+        conn.execute("COMMIT")
+    except duckdb.Error:
+        conn.execute("ROLLBACK")
+        raise
+    return True
+
+
+def create_rollup_tables(conn):
+    """Crea las tablas de agregados si todavía no existen."""
+    metric_columns = ", ".join(
+        f"{metric}_min DOUBLE, {metric}_max DOUBLE, {metric}_sum DOUBLE, {metric}_count BIGINT"
+        for metric in ROLLUP_METRICS
+    )
+    for table, _, _, _ in ROLLUP_TIERS:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                     f"(bucket TIMESTAMP, hostname VARCHAR, samples BIGINT, {metric_columns})")
+
+
+def tier_end(conn, table, seconds):
+    """Devuelve el final del último intervalo agregado en un nivel, o None si está vacío."""
+    last_bucket = conn.execute(f"SELECT max(bucket) FROM {table}").fetchone()[0]
+    if last_bucket is None:
+        return None
+    return last_bucket + datetime.timedelta(seconds=seconds)
+
+
+def rollup_tier(conn, table, seconds, source, cutoff):
+    """
+    Agrega en 'table' los intervalos cerrados de 'source' posteriores al último ya
+    agregado y anteriores a 'cutoff'.
+
+    :return: Número de intervalos insertados.
+    """
+    start = tier_end(conn, table, seconds)
+    if source == "metricas":
+        time_column = "timestamp"
+        samples = "count(*)"
+        aggregates = ", ".join(f"min({m}), max({m}), sum({m}), count({m})" for m in ROLLUP_METRICS)
+        filters, parameters = ["timestamp < ?"], [cutoff]
+        if start is not None:
+            filters.append("timestamp >= ?")
+            parameters.append(start)
+    else:
+        time_column = "bucket"
+        samples = "sum(samples)"
+        aggregates = ", ".join(f"min({m}_min), max({m}_max), sum({m}_sum), sum({m}_count)" for m in ROLLUP_METRICS)
+        filters, parameters = ["bucket < ?"], [cutoff]
+        if start is not None:
+            filters.append("bucket >= ?")
+            parameters.append(start)
+
+    result = conn.execute(f"""
+        INSERT INTO {table}
+        SELECT time_bucket(to_seconds({seconds}), {time_column}) AS bucket, hostname, {samples}, {aggregates}
+        FROM {source}
+        WHERE {' AND '.join(filters)}
+        GROUP BY 1, 2
+    """, parameters).fetchone()
+    return result[0] if result else 0
+
+
+def run_maintenance(conn, raw_retention_days=RAW_RETENTION_DAYS, now=None, archive_dir=None):
+    """
+    Ejecuta la agregación y la retención sobre una conexión de escritura.
+
+    :param conn: Conexión DuckDB de lectura/escritura.
+    :param raw_retention_days: Días que se conservan las filas crudas en la tabla.
+    :param now: Instante de referencia (por defecto, la hora local actual).
+    :param archive_dir: Directorio del archivo Parquet al que se exportan las filas crudas
+                        antes de borrarlas (None para borrarlas sin archivar).
+    :return: Diccionario con los intervalos agregados y las filas archivadas y borradas por tabla;
+             si la exportación al archivo falla, 'archive_error' lleva el mensaje del error.
+    """
+    now = now or datetime.datetime.now()
+    migrate_timestamp_column(conn)
+    create_rollup_tables(conn)
+    summary = {}
+
+    # 1. Agregación: cada nivel solo llega hasta donde está completo el nivel de origen
+    source_end = floor_time(now - datetime.timedelta(seconds=ROLLUP_DELAY_SECONDS), ROLLUP_TIERS[0][1])
+    for table, seconds, source, _ in ROLLUP_TIERS:
+        cutoff = floor_time(source_end, seconds)
+        summary[f"{table}_buckets"] = rollup_tier(conn, table, seconds, source, cutoff)
+        source_end = tier_end(conn, table, seconds) or cutoff
+
+    # 2. Retención: se borra solo lo que ya está agregado en el nivel siguiente
+    retention = [("metricas", "timestamp", raw_retention_days)]
+    retention += [(table, "bucket", days) for table, _, _, days in ROLLUP_TIERS]
+    for (table, time_column, days), next_tier in zip(retention, ROLLUP_TIERS + [None]):
+        if days is None or next_tier is None:
+            continue
+        limit = now - datetime.timedelta(days=days)
+        covered = tier_end(conn, next_tier[0], next_tier[1])
+        if covered is None:
+            continue
+        limit = min(limit, covered)
+        if table == "metricas" and archive_dir is not None:
+            # Si el borrado fallara tras exportar, la siguiente pasada volvería a exportar esas filas
+            try:
+                summary["metricas_archived"] = export_archive(conn, archive_dir, limit)
+            except ArchiveError as e:
+                # Sin archivar no se borra: las filas siguen en la tabla hasta la próxima pasada
+                summary["archive_error"] = str(e)
+                continue
+        deleted = conn.execute(f"DELETE FROM {table} WHERE {time_column} < ?", [limit]).fetchone()
+        summary[f"{table}_deleted"] = deleted[0] if deleted else 0
+
+    # Las muestras de procesos no se agregan: se borran al superar su retención
+    has_process_samples = conn.execute(
+        "SELECT count(*) FROM information_schema.tables WHERE table_name = 'process_samples'"
+    ).fetchone()[0]
+    if has_process_samples:
+        limit = now - datetime.timedelta(days=PROCESS_SAMPLES_RETENTION_DAYS)
+        deleted = conn.execute("DELETE FROM process_samples WHERE timestamp < ?", [limit]).fetchone()
+        summary["process_samples_deleted"] = deleted[0] if deleted else 0
+
+    return summary
+
+
+def run_maintenance_once(db_path):
+    """Ejecuta el mantenimiento una vez (opción --maintain) y muestra el resumen."""
+    if not os.path.exists(db_path):
+        print(f"No existe la base de datos '{db_path}'. ¿Se ha ejecutado el recolector (--collect)?")
+        return
+    with duckdb.connect(database=db_path) as conn:
+        try:
+            summary = run_maintenance(conn, archive_dir=archive_path(db_path))
+        except duckdb.CatalogException as e:
+            print(f"No se pudo ejecutar el mantenimiento: {e}. ¿Se ha ejecutado el recolector (--collect)?")
+            return
+    archive_error = summary.pop("archive_error", None)
+    for name, count in summary.items():
+        print(f"{name}: {count}")
+    if archive_error is not None:
+        print(f"Error de archivo: {archive_error}")
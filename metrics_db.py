@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+# Título: Acceso de solo lectura a la base de datos de métricas (DuckDB)
+
+"""
+Este módulo contiene el gestor de conexión de solo lectura utilizado por la
+aplicación de chat para consultar el archivo 'monitoreo.duckdb', junto con la
+caché del último registro de la tabla 'metricas' y la definición del esquema
+de esa tabla que comparten el recolector y el mantenimiento.
+
+En lugar de abrir y cerrar una conexión por cada consulta, el gestor mantiene
+una conexión de solo lectura abierta y la reutiliza mientras el archivo no
+cambie. Para que el proceso de escritura externo pueda seguir tomando el
+bloqueo del archivo de forma periódica, la conexión se libera:
+
+- cuando lleva abierta más de 'max_hold_seconds' (tras lo cual no se reabre
+  hasta que pasa la ventana de liberación 'release_window_seconds');
+- cuando no se ha usado durante 'idle_release_seconds';
+- cuando la firma del archivo (tamaño y fecha de modificación del .duckdb y
+  de su .wal) indica que el escritor confirmó cambios.
+"""
+
+import os
+import threading
+import time
+
+import duckdb
+
+from spans import recorder
+
+# Esquema de la tabla 'metricas', en el orden de sus columnas
+METRICAS_SCHEMA = [
+    ("timestamp", "TIMESTAMP"),
+    ("hostname", "VARCHAR"),
+    ("username", "VARCHAR"),
+    ("cpu_percent", "DOUBLE"),
+    ("cpu_freq", "DOUBLE"),
+    ("ram_percent", "DOUBLE"),
+    ("ram_used", "DOUBLE"),
+    ("ram_total", "DOUBLE"),
+    ("ram_free", "DOUBLE"),
+    ("disk_percent", "DOUBLE"),
+    ("disk_used", "DOUBLE"),
+    ("disk_total", "DOUBLE"),
+    ("disk_free", "DOUBLE"),
+    ("swap_percent", "DOUBLE"),
+    ("swap_usado", "DOUBLE"),
+    ("swap_total", "DOUBLE"),
+    ("red_bytes_sent", "DOUBLE"),
+    ("red_bytes_recv", "DOUBLE"),
+    ("cpu_temp_celsius", "DOUBLE"),
+    ("battery_percent", "DOUBLE"),
+    ("cpu_power_package", "DOUBLE"),
+    ("cpu_power_cores", "DOUBLE"),
+    ("cpu_clocks", "DOUBLE"),
+]
+
+# Esquema de la tabla 'process_samples': grupos de procesos (por nombre) con más CPU
+# y con más memoria en cada muestra del recolector
+PROCESS_SAMPLES_SCHEMA = [
+    ("timestamp", "TIMESTAMP"),
+    ("hostname", "VARCHAR"),
+    ("name", "VARCHAR"),
+    ("pid_count", "INTEGER"),
+    ("cpu_percent", "DOUBLE"),
+    ("rss", "BIGINT"),
+]
+
+# Campos por los que el recolector elige los grupos que guarda en 'process_samples': el
+# top-K de cada uno, de modo que el historial puede ordenar por cualquiera de ellos
+PROCESS_SAMPLE_FIELDS = ('cpu_percent', 'rss')
+
+
+class ReadOnlyConnectionManager:
+    """
+    Gestiona una conexión persistente de solo lectura a un archivo DuckDB,
+    reabriéndola únicamente cuando el archivo cambia o cuando hay que cederle
+    el bloqueo al proceso de escritura.
+    """
+
+    # Reintentos al abrir si el escritor tiene tomado el bloqueo del archivo
+    CONNECT_RETRIES = 3
+    CONNECT_RETRY_DELAY = 0.1
+
+    def __init__(self, db_path, max_hold_seconds=5.0, release_window_seconds=1.0,
+                 idle_release_seconds=2.0, on_connect=None):
+        """
+        :param db_path: Ruta del archivo .duckdb.
+        :param max_hold_seconds: Tiempo máximo que la conexión permanece abierta de forma continua.
+        :param release_window_seconds: Tiempo durante el cual no se reabre la conexión tras una
+                                       liberación forzada, para que el escritor tome el bloqueo.
+        :param idle_release_seconds: Tiempo sin consultas tras el cual se cierra la conexión.
+        :param on_connect: Función opcional que recibe cada conexión recién abierta (p. ej.
+                           para crear vistas temporales, que se pierden al cerrarla).
+        """
+        self.db_path = db_path
+        self.on_connect = on_connect
+        self.max_hold_seconds = max_hold_seconds
+        self.release_window_seconds = release_window_seconds
+        self.idle_release_seconds = idle_release_seconds
+
+        # Generación del archivo: se incrementa cada vez que cambia su firma
+        self.generation = 0
+
+        self._lock = threading.RLock()
+        self._conn = None
+        self._signature = None
+        self._opened_at = 0.0
+        self._last_used = 0.0
+        self._released_at = None
+        self._stop_event = threading.Event()
+        self._reaper = None
+        # Sentencias preparadas (PREPARE) en la conexión abierta; se pierden al cerrarla
+        self._prepared = set()
+        # Esquemas leídos con DESCRIBE: {tabla: (generación, {columna: (posición, tipo)})}
+        self._schemas = {}
+
+    def file_signature(self):
+        """
+        Devuelve la firma actual del archivo de base de datos: tamaño y fecha de
+        modificación del .duckdb y de su registro .wal (None si no existen).
+        """
+        signature = []
+        for path in (self.db_path, self.db_path + ".wal"):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_size, st.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def refresh_generation(self):
+        """
+        Comprueba la firma del archivo y devuelve la generación vigente. Si el
+        archivo cambió, se incrementa la generación y se descarta la conexión
+        abierta para que la siguiente consulta vea los datos nuevos.
+        """
+        with self._lock:
+            signature = self.file_signature()
+            if signature != self._signature:
+                self._signature = signature
+                self.generation += 1
+                self._close_locked()
+            return self.generation
+
+    def execute(self, query, parameters=None):
+        """
+        Ejecuta una consulta sobre la conexión persistente.
+
+        :param query: Consulta SQL a ejecutar.
+        :param parameters: Parámetros opcionales de la consulta.
+        :return: Resultado de la consulta como una lista de tuplas.
+        :raises duckdb.Error: Si la conexión o la consulta fallan.
+        """
+        return self.fetch(query, parameters)[1]
+
+    def fetch(self, query, parameters=None):
+        """
+        Ejecuta una consulta y devuelve también los nombres de sus columnas, tomados
+        de cursor.description, para mapear cada fila sin suponer su orden.
+
+        :param query: Consulta SQL a ejecutar.
+        :param parameters: Parámetros opcionales de la consulta.
+        :return: Tupla (lista de nombres de columnas, lista de tuplas).
+        :raises duckdb.Error: Si la conexión o la consulta fallan.
+        """
+        with self._lock:
+            conn = self._acquire()
+            try:
+                if parameters is None:
+                    cursor = conn.execute(query)
+                else:
+                    cursor = conn.execute(query, parameters)
+                rows = cursor.fetchall()
+                columns = [description[0] for description in cursor.description]
+            except duckdb.Error:
+                # Ante cualquier error se descarta la conexión y se libera el archivo
+                self._close_locked()
+                raise
+            self._last_used = time.monotonic()
+            return columns, rows
+
+    def table_schema(self, table):
+        """
+        Devuelve el esquema de una tabla como {columna: (posición, tipo)}. Se lee con
+        DESCRIBE una sola vez por generación del archivo y se reutiliza mientras el
+        archivo no cambie.
+
+        :param table: Nombre de la tabla.
+        :raises duckdb.Error: Si la tabla no existe o la conexión falla.
+        """
+        with self._lock:
+            generation = self.refresh_generation()
+            cached = self._schemas.get(table)
+            if cached is not None and cached[0] == generation:
+                return cached[1]
+            rows = self.execute(f"DESCRIBE {table}")
+            schema = {row[0]: (position, row[1]) for position, row in enumerate(rows)}
+            self._schemas[table] = (generation, schema)
+            return schema
+
+    def execute_prepared(self, name, query):
+        """
+        Ejecuta una sentencia preparada con nombre sobre la conexión persistente.
+        La sentencia se prepara (PREPARE) la primera vez que se usa en cada conexión
+        y las siguientes ejecuciones solo hacen EXECUTE, sin volver a analizar el SQL.
+
+        :param name: Identificador SQL de la sentencia preparada.
+        :param query: Consulta SQL (sin parámetros) que se prepara bajo ese nombre.
+        :return: Resultado de la consulta como una lista de tuplas.
+        :raises duckdb.Error: Si la conexión o la consulta fallan.
+        """
+        with self._lock:
+            conn = self._acquire()
+            try:
+                if name not in self._prepared:
+                    conn.execute(f"PREPARE {name} AS {query}")
+                    self._prepared.add(name)
+                result = conn.execute(f"EXECUTE {name}").fetchall()
+            except duckdb.Error:
+                self._close_locked()
+                raise
+            self._last_used = time.monotonic()
+            return result
+
+    def release(self):
+        """Cierra la conexión abierta (si la hay) liberando el archivo para el escritor."""
+        with self._lock:
+            self._close_locked()
+
+    def close(self):
+        """Cierra la conexión y detiene el hilo de liberación por inactividad."""
+        self._stop_event.set()
+        self.release()
+        if self._reaper is not None and self._reaper is not threading.current_thread():
+            self._reaper.join(timeout=1.0)
+        self._reaper = None
+
+    def _acquire(self):
+        """Devuelve la conexión abierta, reabriéndola si el archivo cambió o si expiró su tiempo."""
+        self.refresh_generation()
+        now = time.monotonic()
+
+        if self._conn is not None and now - self._opened_at >= self.max_hold_seconds:
+            # Se cede el archivo al escritor durante la ventana de liberación
+            self._close_locked()
+            self._released_at = now
+
+        if self._conn is None:
+            if self._released_at is not None:
+                remaining = self._released_at + self.release_window_seconds - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+                self._released_at = None
+                # El escritor pudo haber confirmado cambios durante la ventana
+                self.refresh_generation()
+            self._conn = self._connect()
+            if self.on_connect is not None:
+                try:
+                    self.on_connect(self._conn)
+                except duckdb.Error:
+                    self._close_locked()
+                    raise
+            self._opened_at = self._last_used = time.monotonic()
+            self._start_reaper()
+
+        return self._conn
+
+    def _connect(self):
+        """Abre la conexión de solo lectura, reintentando si el escritor tiene el bloqueo."""
+        for attempt in range(self.CONNECT_RETRIES):
+            try:
+                with recorder.span("duckdb.connect"):
+                    return duckdb.connect(database=self.db_path, read_only=True)
+            except duckdb.IOException:
+                if attempt == self.CONNECT_RETRIES - 1:
+                    raise
+                time.sleep(self.CONNECT_RETRY_DELAY)
+
+    def _close_locked(self):
+        """Cierra la conexión; debe llamarse con el candado tomado."""
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except duckdb.Error:
+                pass
+            self._conn = None
+            self._prepared.clear()
+
+    def _start_reaper(self):
+        """Arranca (una sola vez) el hilo que libera la conexión tras un periodo de inactividad."""
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._stop_event.clear()
+        self._reaper = threading.Thread(target=self._reap_idle, name="duckdb-idle-release", daemon=True)
+        self._reaper.start()
+
+    def _reap_idle(self):
+        """Bucle del hilo de liberación: cierra la conexión si lleva inactiva demasiado tiempo."""
+        interval = max(0.05, min(self.idle_release_seconds, self.max_hold_seconds) / 2)
+        while not self._stop_event.wait(interval):
+            with self._lock:
+                if self._conn is None:
+                    continue
+                now = time.monotonic()
+                if now - self._opened_at >= self.max_hold_seconds:
+                    self._close_locked()
+                    self._released_at = now
+                elif now - self._last_used >= self.idle_release_seconds:
+                    self._close_locked()
+
+
+class LatestRowCache:
+    """
+    Caché del último registro de la tabla 'metricas', con los valores tal como los
+    devuelve DuckDB (sin formatear: cada consumidor aplica su formato). Puede
+    contener el registro completo o solo las columnas consultadas hasta ahora.
+
+    La entrada se identifica por la marca de tiempo del registro y por la firma del
+    archivo en el momento de guardarla. Se invalida en cuanto cambia la firma del
+    archivo; cuando expira el TTL se revalida con una consulta mínima
+    (max(timestamp)) y solo se descarta si apareció un registro más reciente.
+    """
+
+    def __init__(self, reader, ttl_seconds=10.0, table="metricas", host=None):
+        """
+        :param reader: Gestor de conexión (ReadOnlyConnectionManager) usado para revalidar.
+        :param ttl_seconds: Tiempo de validez de la entrada antes de revalidarla.
+        :param table: Tabla de la que procede el registro.
+        :param host: Si se indica, el registro es el último de ese host (columna 'hostname',
+                     sin distinguir mayúsculas) y la revalidación se limita a él.
+        """
+        self.reader = reader
+        self.ttl_seconds = ttl_seconds
+        self.table = table
+        self.host = host
+        self._lock = threading.Lock()
+        self._value = None
+        self._key = None
+        self._complete = False
+        self._signature = None
+        self._expires_at = 0.0
+
+    def get(self, columns=None):
+        """
+        Devuelve una copia del registro en caché, o None si no hay entrada válida.
+
+        :param columns: Columnas que se necesitan. Si es None, solo sirve una entrada
+                        con el registro completo.
+        """
+        with self._lock:
+            if self._value is None:
+                return None
+            if columns is None:
+                if not self._complete:
+                    return None
+            elif any(column not in self._value for column in columns):
+                return None
+            if self.reader.file_signature() != self._signature:
+                self._value = None
+                return None
+            if time.monotonic() >= self._expires_at:
+                try:
+                    if self.host is None:
+                        latest = self.reader.execute(f"SELECT max(timestamp) FROM {self.table}")
+                    else:
+                        latest = self.reader.execute(
+                            f"SELECT max(timestamp) FROM {self.table} WHERE lower(hostname) = ?",
+                            [self.host.lower()])
+                except duckdb.Error:
+                    self._value = None
+                    return None
+                if not latest or latest[0][0] != self._key:
+                    self._value = None
+                    return None
+                self._expires_at = time.monotonic() + self.ttl_seconds
+            return dict(self._value)
+
+    def store(self, value, key, complete=True):
+        """
+        Guarda un registro.
+
+        :param value: Diccionario con los valores sin formatear.
+        :param key: Marca de tiempo del registro.
+        :param complete: False si solo contiene algunas columnas; en ese caso se
+                         combina con la entrada vigente cuando es del mismo registro.
+        """
+        with self._lock:
+            signature = self.reader.file_signature()
+            if (not complete and self._value is not None and self._key == key
+                    and self._signature == signature):
+                self._value.update(value)
+                return
+            self._value = dict(value)
+            self._key = key
+            self._complete = complete
+            self._signature = signature
+            self._expires_at = time.monotonic() + self.ttl_seconds
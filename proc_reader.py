@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Título: Lectura directa de /proc para el muestreador de procesos (Linux)
+
+"""
+Este módulo contiene el lector de /proc que usa el muestreador de procesos
+(process_monitor.py) en Linux en lugar de psutil.
+
+psutil crea un objeto por proceso y, por cada atributo, abre y analiza su
+archivo de /proc por separado (stat, statm, status, io...). Con miles de
+procesos ese coste domina la pasada. Este lector abre una sola vez por pasada
+/proc/<pid>/stat, que ya contiene el nombre, el proceso padre, el tiempo de CPU,
+los hilos, la memoria residente y el instante de arranque, y /proc/<pid>/io para
+la E/S.
+Lee cada archivo con os.open/os.readv sobre un único búfer que se reutiliza, y
+solo convierte los campos que necesita.
+
+El instante de arranque (campo starttime de stat) identifica al proceso junto
+con su PID: si un PID se reutiliza, su starttime cambia y los contadores de
+CPU y E/S empiezan de cero, sin consultas adicionales.
+
+En otros sistemas (o si /proc no está montado) available() devuelve False y el
+muestreador sigue usando psutil.
+"""
+
+import os
+import sys
+import time
+
+# Raíz del sistema de archivos de procesos
+PROC_ROOT = "/proc"
+
+# Tamaño del búfer de lectura: una línea de stat ocupa unos 300 bytes y, en el peor caso, poco más de 1 KB
+READ_BUFFER_SIZE = 4096
+
+# Longitud máxima del nombre en stat (TASK_COMM_LEN - 1); los nombres de esa longitud pueden estar truncados
+COMM_MAX_LENGTH = 15
+
+# Posición de cada campo en stat contando desde el estado (campo 3 de proc(5)), tras el nombre entre paréntesis
+STAT_PPID = 1
+STAT_UTIME = 11
+STAT_STIME = 12
+STAT_NUM_THREADS = 17
+STAT_STARTTIME = 19
+STAT_RSS = 21
+
+# Campos de la instantánea que este lector puede medir
+PROC_FIELDS = ('cpu_percent', 'rss', 'io_read', 'io_write', 'threads')
+
+
+def available(proc_root=PROC_ROOT):
+    """Indica si se puede leer /proc directamente (Linux con /proc montado)."""
+    return sys.platform.startswith("linux") and os.path.exists(os.path.join(proc_root, "self", "stat"))
+
+
+class ProcStatReader:
+    """
+    Lector de /proc que devuelve, en cada pasada, el consumo de todos los procesos
+    desde la pasada anterior.
+    """
+
+    def __init__(self, proc_root=PROC_ROOT):
+        """
+        :param proc_root: Raíz de /proc (se puede cambiar para leer un árbol copiado).
+        """
+        self.proc_root = proc_root
+        self._buffer = bytearray(READ_BUFFER_SIZE)
+        self._buffers = [self._buffer]
+        self._clock_ticks = os.sysconf("SC_CLK_TCK")
+        self._page_size = os.sysconf("SC_PAGE_SIZE")
+        # /proc/<pid>/io no existe en núcleos sin contabilidad de tareas
+        self.read_io = os.path.exists(os.path.join(proc_root, "self", "io"))
+        self.fields = [field for field in PROC_FIELDS if self.read_io or not field.startswith("io_")]
+        # Por PID: (starttime, ticks de CPU, bytes leídos, bytes escritos, nombre en stat, nombre) de la pasada anterior
+        self._previous = {}
+        self._previous_at = None
+
+    def _read_file(self, path):
+        """
+        Lee un archivo de /proc en el búfer compartido.
+
+        :return: Número de bytes leídos, o -1 si el archivo no se puede leer (proceso
+                 terminado o sin permiso).
+        """
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return -1
+        try:
+            return os.readv(fd, self._buffers)
+        except OSError:
+            return -1
+        finally:
+            os.close(fd)
+
+    def _read_io(self, pid):
+        """Devuelve (bytes leídos, bytes escritos) de /proc/<pid>/io, o None si no se puede leer."""
+        buffer = self._buffer
+        size = self._read_file(f"{self.proc_root}/{pid}/io")
+        if size <= 0:
+            return None
+        read_start = buffer.find(b"\nread_bytes: ", 0, size)
+        write_start = buffer.find(b"\nwrite_bytes: ", 0, size)
+        if read_start < 0 or write_start < 0:
+            return None
+        read_start += 13
+        write_start += 14
+        return (int(buffer[read_start:buffer.find(b"\n", read_start, size)]),
+                int(buffer[write_start:buffer.find(b"\n", write_start, size)]))
+
+    def _full_name(self, pid, comm):
+        """
+        Completa un nombre truncado a 15 caracteres con el del ejecutable de la línea
+        de comandos, como hace psutil (se hace una sola vez por proceso).
+        """
+        buffer = self._buffer
+        size = self._read_file(f"{self.proc_root}/{pid}/cmdline")
+        if size <= 0:
+            return comm
+        end = buffer.find(b"\0", 0, size)
+        executable = os.path.basename(bytes(buffer[:end if end >= 0 else size]).decode("utf-8", "replace"))
+        return executable if executable.startswith(comm) else comm
+
+    def read(self):
+        """
+        Recorre /proc y devuelve el consumo de cada proceso. La primera pasada no
+        tiene con qué comparar: la CPU y la E/S salen a 0.
+
+        :return: Lista de tuplas (pid, pid del padre, nombre, valores), con los valores en
+                 el orden de 'fields': % de CPU, RSS en bytes, bytes/s leídos y escritos
+                 (None si la E/S de ese proceso no se puede leer) e hilos.
+        """
+        now = time.monotonic()
+        elapsed = now - self._previous_at if self._previous_at is not None else None
+        clock_ticks = self._clock_ticks
+        page_size = self._page_size
+        read_io = self.read_io
+        buffer = self._buffer
+        previous = self._previous
+        current = {}
+        records = []
+        for entry in os.listdir(self.proc_root):
+            if not entry.isdigit():
+                continue
+            pid = int(entry)
+            size = self._read_file(f"{self.proc_root}/{entry}/stat")
+            if size <= 0:
+                continue
+            name_end = buffer.rfind(b")", 0, size)
+            fields = buffer[name_end + 2:size].split(None, STAT_RSS + 1)
+            if len(fields) <= STAT_RSS:
+                continue
+            ticks = int(fields[STAT_UTIME]) + int(fields[STAT_STIME])
+            starttime = int(fields[STAT_STARTTIME])
+
+            comm = buffer[buffer.find(b"(", 0, size) + 1:name_end]
+
+            before = previous.get(pid)
+            if before is not None and before[0] != starttime:
+                # PID reutilizado por otro proceso: se descartan sus contadores
+                before = None
+            if before is not None and before[4] == comm:
+                name = before[5]
+            else:
+                # Proceso nuevo o que ha cambiado de nombre (exec): se decodifica una vez
+                name = comm.decode("utf-8", "replace")
+                if len(name) >= COMM_MAX_LENGTH:
+                    name = self._full_name(entry, name)
+
+            cpu_percent = 0.0
+            if before is not None and elapsed:
+                cpu_percent = (ticks - before[1]) / clock_ticks / elapsed * 100
+
+            io_read = io_write = None
+            counters = self._read_io(entry) if read_io else None
+            if counters is not None:
+                io_read = io_write = 0.0
+                if before is not None and before[2] is not None and elapsed:
+                    io_read = max(counters[0] - before[2], 0) / elapsed
+                    io_write = max(counters[1] - before[3], 0) / elapsed
+                current[pid] = (starttime, ticks, counters[0], counters[1], comm, name)
+            else:
+                current[pid] = (starttime, ticks, None, None, comm, name)
+
+            rss = int(fields[STAT_RSS]) * page_size
+            threads = int(fields[STAT_NUM_THREADS])
+            values = ((cpu_percent, rss, io_read, io_write, threads) if read_io
+                      else (cpu_percent, rss, threads))
+            records.append((pid, int(fields[STAT_PPID]), name, values))
+
+        self._previous = current
+        self._previous_at = now
+        return records
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+# Título: Muestreo en segundo plano del consumo de los procesos (psutil)
+
+"""
+Este módulo contiene el muestreador de procesos que alimenta la opción
+"Top 10 Apps High CPU" y los comandos "top <n> <cpu|rss|io_read|...>" de la
+aplicación de chat.
+
+En lugar de llamar a cpu_percent(interval=0.1) proceso a proceso (lo que
+duerme 100 ms por cada uno), un hilo en segundo plano recorre todos los
+procesos una vez por intervalo: cada lectura de cpu_percent(None) devuelve el
+consumo desde la pasada anterior y, a la vez, deja preparado el contador para
+la siguiente. El resultado agrupado por nombre se publica como una instantánea
+que la interfaz consulta al instante.
+
+Una sola pasada de process_iter(attrs=[...]) lee todos los atributos de cada
+proceso dentro de oneshot() (psutil agrupa las lecturas de /proc o de la API del
+sistema), de modo que la misma instantánea sirve para ordenar por CPU, memoria,
+E/S, hilos o handles. Las clasificaciones se eligen con heapq.nlargest, sin
+ordenar todos los grupos (ver top_groups).
+
+El muestreador mantiene su propio mapa PID -> psutil.Process entre pasadas: solo
+crea instancias para los PID nuevos y retira las de los procesos que ya no
+existen, de modo que cada proceso conserva sus contadores de CPU y no se vuelven
+a abrir sus entradas en cada pasada. Si un PID se reutiliza (el nombre cambia o
+el tiempo de CPU acumulado retrocede), se comprueba su fecha de creación y, si
+es otro proceso, se sustituye la instancia.
+
+En Linux, el muestreador no usa psutil para las pasadas: lee /proc directamente
+con proc_reader.ProcStatReader (un archivo stat por proceso, con un búfer
+reutilizado), que es varias veces más rápido con miles de procesos. En el resto
+de sistemas se usa psutil como se describe arriba.
+
+Además de por nombre, el consumo se puede agrupar por aplicación (modo 'tree'):
+cada proceso suma en el de más arriba de su árbol, de modo que los procesos
+hijos de un navegador, de una aplicación Electron o de un pool de workers
+cuentan para su aplicación aunque tengan otro nombre. El árbol se reconstruye
+con el PID del padre que se lee en la misma pasada, sin llamadas adicionales
+por proceso (ver application_roots).
+"""
+
+import heapq
+import threading
+import time
+
+import psutil
+
+import proc_reader
+
+# Clasificaciones del comando "top": nombre en el comando -> campo de la instantánea
+PROCESS_RANKINGS = {
+    'cpu': 'cpu_percent',
+    'rss': 'rss',
+    'io_read': 'io_read',
+    'io_write': 'io_write',
+    'threads': 'threads',
+    'handles': 'handles',
+}
+
+# Atributos de psutil que necesita cada campo; io_counters no existe en macOS y num_handles solo en Windows
+FIELD_ATTRIBUTES = {
+    'cpu_percent': 'cpu_percent',
+    'rss': 'memory_info',
+    'io_read': 'io_counters',
+    'io_write': 'io_counters',
+    'threads': 'num_threads',
+    'handles': 'num_handles',
+}
+
+
+# Agrupaciones de la instantánea: por nombre de proceso o por aplicación (árbol de procesos)
+PROCESS_GROUPINGS = ('name', 'tree')
+
+# Procesos que lanzan aplicaciones (init, sesiones, shells, escritorios): sus hijos se
+# consideran aplicaciones independientes en lugar de sumarse a ellos en el modo 'tree'
+TREE_BOUNDARY_NAMES = frozenset({
+    "systemd", "init", "kthreadd", "launchd", "login", "sshd", "su", "sudo", "tmux: server", "screen",
+    "sh", "bash", "zsh", "fish", "dash", "gnome-shell", "plasmashell", "gnome-terminal-server", "konsole",
+    "explorer.exe", "services.exe", "wininit.exe", "winlogon.exe", "svchost.exe", "cmd.exe",
+    "powershell.exe", "pwsh.exe", "WindowsTerminal.exe",
+})
+
+
+def supported_fields():
+    """Devuelve los campos de la instantánea que este sistema puede medir."""
+    return [field for field, attribute in FIELD_ATTRIBUTES.items() if hasattr(psutil.Process, attribute)]
+
+
+def top_groups(aggregated, n, field='cpu_percent'):
+    """
+    Devuelve los n grupos con mayor valor en 'field', de mayor a menor. Los grupos
+    sin consumo (valor 0 o desconocido) no se incluyen. heapq.nlargest mantiene un
+    montículo de tamaño n: O(G log n) en lugar de ordenar los G grupos.
+
+    :param aggregated: Instantánea {nombre: {campo: valor}}.
+    :return: Lista [(nombre, datos del grupo), ...].
+    """
+    candidates = ((name, data) for name, data in aggregated.items() if data.get(field))
+    return heapq.nlargest(n, candidates, key=lambda item: item[1][field])
+
+
+def application_roots(records):
+    """
+    Calcula, para cada proceso, el nombre de la aplicación a la que pertenece: su
+    antepasado más alto por debajo de un proceso lanzador (TREE_BOUNDARY_NAMES), de
+    init o de un padre que ya no existe. Cada proceso se visita una vez: la raíz
+    encontrada se guarda para todos los procesos del camino recorrido.
+
+    :param records: Lista de (pid, pid del padre, nombre, valores) de una misma pasada.
+    :return: Lista con el nombre de la raíz de cada registro, en el mismo orden.
+    """
+    parents = {pid: (ppid, name) for pid, ppid, name, _ in records}
+    roots = {}
+    for pid in parents:
+        path = []
+        current = pid
+        while current not in roots:
+            path.append(current)
+            ppid = parents[current][0]
+            parent = parents.get(ppid)
+            # El límite de longitud evita un bucle si la lista de PID cambió a mitad de pasada
+            if parent is None or ppid <= 1 or parent[1] in TREE_BOUNDARY_NAMES or len(path) > len(parents):
+                roots[current] = parents[current][1]
+                break
+            current = ppid
+        root = roots[current]
+        for visited in path:
+            roots[visited] = root
+    return [roots[record[0]] for record in records]
+
+
+def aggregate(records, fields, keys):
+    """
+    Suma los valores de los procesos por grupo.
+
+    :param records: Lista de (pid, pid del padre, nombre, valores en el orden de 'fields').
+    :param keys: Clave de grupo de cada registro, en el mismo orden.
+    :return: {clave: {'count': procesos, campo: suma}}; los valores None no suman.
+    """
+    aggregated = {}
+    for key, record in zip(keys, records):
+        group = aggregated.get(key)
+        if group is None:
+            group = aggregated[key] = dict.fromkeys(fields, 0)
+            group['count'] = 0
+        group['count'] += 1
+        for field, value in zip(fields, record[3]):
+            if value is not None:
+                group[field] += value
+    return aggregated
+
+
+class TopProcessSampler:
+    """
+    Hilo de muestreo que mantiene una instantánea continua del consumo de los
+    procesos (CPU, memoria, E/S, hilos, handles), agrupado por nombre o por aplicación.
+    """
+
+    def __init__(self, interval=1.0, use_proc=True):
+        """
+        :param interval: Segundos entre dos pasadas; es el intervalo sobre el que se mide la CPU.
+        :param use_proc: Si es posible (Linux), lee /proc directamente en lugar de usar psutil.
+        """
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        # Procesos de la última pasada y su agrupación por aplicación, que se calcula al pedirla
+        self._records = None
+        self._tree_snapshot = None
+        self._sampled_at = None
+        self._ready = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._reader = proc_reader.ProcStatReader() if use_proc and proc_reader.available() else None
+        if self._reader is not None:
+            self.fields = [field for field in FIELD_ATTRIBUTES if field in self._reader.fields]
+        else:
+            self.fields = supported_fields()
+        self._attributes = ['name'] + sorted({FIELD_ATTRIBUTES[field] for field in self.fields})
+        # cpu_times se lee en el mismo oneshot y sirve para detectar PID reutilizados; ppid, para el árbol
+        self._attributes += ['cpu_times', 'ppid']
+        # Procesos seguidos entre pasadas: PID -> psutil.Process, y PID -> (nombre, CPU acumulada)
+        self._processes = {}
+        self._identities = {}
+        # Contadores de E/S de la pasada anterior por PID, para calcular bytes por segundo
+        self._previous_io = {}
+        self._previous_pass_at = None
+
+    def start(self):
+        """
+        Arranca el hilo de muestreo si no está en marcha. Se comprueba bajo el candado:
+        dos hilos del pool que lo pidan a la vez no arrancan dos muestreadores (que
+        compartirían el búfer del lector de /proc).
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="top-process-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Detiene el hilo de muestreo."""
+        with self._lock:
+            self._stop_event.set()
+            thread, self._thread = self._thread, None
+        # Se espera fuera del candado: el hilo lo toma al publicar cada instantánea
+        if thread is not None:
+            thread.join(timeout=self.interval + 1.0)
+
+    def snapshot(self, timeout=None, grouping='name'):
+        """
+        Devuelve la última instantánea publicada.
+
+        :param timeout: Segundos a esperar si todavía no hay ninguna muestra completa.
+        :param grouping: 'name' agrupa por nombre de proceso; 'tree', por aplicación (la
+                         raíz de cada árbol de procesos, ver application_roots).
+        :return: Tupla (momento de la muestra, {grupo: {'count', 'cpu_percent', 'rss', ...}}), o None.
+        """
+        if not self._ready.wait(timeout):
+            return None
+        with self._lock:
+            if grouping == 'tree':
+                if self._tree_snapshot is None:
+                    self._tree_snapshot = aggregate(self._records, self.fields, application_roots(self._records))
+                return self._sampled_at, dict(self._tree_snapshot)
+            return self._sampled_at, dict(self._snapshot)
+
+    def sample(self):
+        """
+        Hace una pasada, la publica como instantánea y la devuelve. La usa el hilo de
+        muestreo y también el recolector, que muestrea desde su propio bucle sin hilo.
+        La primera llamada solo prepara los contadores de CPU (todos a 0 %).
+
+        :return: La instantánea agrupada por nombre.
+        """
+        records = self._sample_pass()
+        aggregated = aggregate(records, self.fields, [record[2] for record in records])
+        with self._lock:
+            self._snapshot = aggregated
+            self._records = records
+            self._tree_snapshot = None
+            self._sampled_at = time.time()
+        self._ready.set()
+        return aggregated
+
+    def _run(self):
+        """Bucle del hilo: una pasada de preparación y después una pasada por intervalo."""
+        self._sample_pass()
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def _track_processes(self):
+        """
+        Actualiza el mapa de procesos seguidos con la lista actual de PID: añade los
+        nuevos y retira los que ya no existen.
+
+        :return: El mapa PID -> psutil.Process.
+        """
+        processes = self._processes
+        pids = psutil.pids()
+        alive = set(pids)
+        for pid in [pid for pid in processes if pid not in alive]:
+            self._forget(pid)
+        for pid in pids:
+            if pid not in processes:
+                try:
+                    processes[pid] = psutil.Process(pid)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+        return processes
+
+    def _forget(self, pid):
+        """Deja de seguir un PID."""
+        self._processes.pop(pid, None)
+        self._identities.pop(pid, None)
+        self._previous_io.pop(pid, None)
+
+    def _read(self, pid, process):
+        """
+        Lee los atributos de un proceso seguido y, si todo indica que el PID pertenece
+        ahora a otro proceso, lo confirma con la fecha de creación y lo sustituye.
+
+        :return: Diccionario de atributos, o None si el proceso ya no existe.
+        """
+        try:
+            info = process.as_dict(self._attributes, ad_value=None)
+        except psutil.NoSuchProcess:
+            self._forget(pid)
+            return None
+        times = info['cpu_times']
+        identity = (info['name'], times.user + times.system if times is not None else None)
+        previous = self._identities.get(pid)
+        self._identities[pid] = identity
+        if previous is None or (previous[0] == identity[0] and
+                                (identity[1] is None or previous[1] is None or identity[1] >= previous[1])):
+            return info
+        try:
+            current = psutil.Process(pid)
+            if current.create_time() == process.create_time():
+                return info
+        except psutil.NoSuchProcess:
+            self._forget(pid)
+            return None
+        except psutil.AccessDenied:
+            return info
+        # PID reutilizado: la nueva instancia empieza sus contadores desde cero
+        self._forget(pid)
+        self._processes[pid] = current
+        try:
+            info = current.as_dict(self._attributes, ad_value=None)
+        except psutil.NoSuchProcess:
+            self._forget(pid)
+            return None
+        self._identities[pid] = (info['name'], None)
+        return info
+
+    def _sample_pass(self):
+        """
+        Lee el consumo de todos los procesos con el lector de /proc (ver proc_reader.py)
+        o, si no está disponible, con psutil.
+
+        :return: Lista de (pid, pid del padre, nombre, valores en el orden de 'fields').
+        """
+        if self._reader is not None:
+            return self._reader.read()
+        return self._psutil_pass()
+
+    def _psutil_pass(self):
+        """
+        Lee todos los atributos de cada proceso seguido en una sola pasada. Las
+        instancias de Process se conservan entre pasadas, por lo que cada lectura de
+        cpu_percent también prepara el contador para la siguiente pasada. La E/S se
+        expresa en bytes por segundo desde la pasada anterior.
+        """
+        now = time.monotonic()
+        elapsed = now - self._previous_pass_at if self._previous_pass_at is not None else None
+        previous_io = self._previous_io
+        current_io = {}
+        records = []
+        for pid, process in list(self._track_processes().items()):
+            info = self._read(pid, process)
+            if info is None:
+                continue
+            name = info['name']
+            if name is None:
+                continue
+            memory = info.get('memory_info')
+            io = info.get('io_counters')
+            io_read = io_write = None
+            if io is not None:
+                current_io[pid] = (io.read_bytes, io.write_bytes)
+                before = previous_io.get(pid)
+                io_read = io_write = 0.0
+                if before is not None and elapsed:
+                    io_read = max(io.read_bytes - before[0], 0) / elapsed
+                    io_write = max(io.write_bytes - before[1], 0) / elapsed
+            values = {
+                'cpu_percent': info['cpu_percent'] or 0.0,
+                'rss': memory.rss if memory is not None else None,
+                'io_read': io_read,
+                'io_write': io_write,
+                'threads': info.get('num_threads'),
+                'handles': info.get('num_handles'),
+            }
+            records.append((pid, info['ppid'] or 0, name, tuple(values[field] for field in self.fields)))
+
+        self._previous_io = current_io
+        self._previous_pass_at = now
+        return records
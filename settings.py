@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Título: Valores por defecto compartidos por las interfaces del monitor
+
+"""
+Este módulo contiene los valores por defecto que necesitan el punto de entrada
+(chat_app.py) y la ventana (chat_window.py) antes de que exista el motor de
+comandos. No importa DuckDB, psutil ni PyQt6: así la ventana se puede pintar sin
+esperar a que se carguen esas librerías (ver load_engine en chat_window.py).
+"""
+
+# Ruta por defecto de la base de datos DuckDB
+DB_PATH = "./data/monitoreo.duckdb"
+
+# Intervalo (ms) de sondeo del modo de vigilancia
+WATCH_POLL_INTERVAL_MS = 1000
+
+# Mensaje de bienvenida de las interfaces interactivas
+GREETING_MESSAGE = ("¡Hola! Soy un bot de monitoreo del sistema. Escribe el número o nombre de una métrica para conocer su valor, añade un rango (por ejemplo 'cpu_percent 1h' o 'ram_percent 7d') para ver su historial, o escribe 'opciones' para ver la lista de métricas. "
+                    "Con varios equipos, 'fleet cpu_percent' compara el último valor de cada uno y 'host <nombre>' limita las consultas a un equipo. "
+                    "'top 5 rss' lista los procesos que más consumen (cpu, rss, io_read, io_write, threads o handles), 'top 5 cpu tree' suma cada aplicación con sus procesos hijos "
+                    "y 'top_10_cpu at 03:00' muestra los que más CPU usaban a esa hora.")
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Título: Registro ligero de duraciones de las rutas calientes (spans)
+
+"""
+Este módulo contiene el registro de tramos ("spans") con el que se sabe de dónde
+viene una respuesta lenta: la conexión a DuckDB, la consulta, el formato o el
+dibujo en Qt. Cada tramo guarda sus últimas duraciones en un búfer circular y el
+comando 'stats' del chat muestra sus percentiles p50/p95/p99.
+
+Uso:
+
+    from spans import recorder, timed
+
+    @timed("get_metrics_data")
+    def get_metrics_data(...): ...
+
+    with recorder.span("duckdb.connect"):
+        ...
+
+Opcionalmente, cada tramo se añade como una línea JSON a un archivo de traza
+(opción --trace de chat_app.py). El coste por tramo es de dos lecturas del reloj
+y una inserción en un deque; no depende de PyQt6, DuckDB ni psutil.
+"""
+
+import contextlib
+import functools
+import json
+import threading
+import time
+from collections import deque
+
+# Duraciones que se conservan por tramo
+SPAN_BUFFER_SIZE = 1024
+
+
+def percentile(ordered, fraction):
+    """Percentil (interpolación al más cercano) de una lista ya ordenada."""
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class SpanRecorder:
+    """
+    Registro de duraciones por nombre de tramo, seguro entre hilos (el motor se
+    ejecuta en el pool de trabajos y la interfaz en el hilo principal).
+    """
+
+    def __init__(self, buffer_size=SPAN_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._totals = {}
+        self._trace_file = None
+
+    def open_trace(self, path):
+        """Empieza a añadir cada tramo como una línea JSON al archivo indicado."""
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+            self._trace_file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def close_trace(self):
+        """Cierra el archivo de traza, si hay uno abierto."""
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+
+    def record(self, name, seconds, started_at=None):
+        """Añade una duración (en segundos) al búfer del tramo."""
+        with self._lock:
+            durations = self._durations.get(name)
+            if durations is None:
+                durations = self._durations[name] = deque(maxlen=self.buffer_size)
+                self._totals[name] = 0
+            durations.append(seconds)
+            self._totals[name] += 1
+            if self._trace_file is not None:
+                self._trace_file.write(json.dumps({
+                    'span': name,
+                    'start': started_at if started_at is not None else time.time() - seconds,
+                    'duration_ms': round(seconds * 1000, 4),
+                    'thread': threading.current_thread().name,
+                }) + "\n")
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Mide el bloque 'with' como un tramo con el nombre indicado."""
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, started_at)
+
+    def reset(self):
+        """Vacía los búferes de todos los tramos."""
+        with self._lock:
+            self._durations.clear()
+            self._totals.clear()
+
+    def summary(self):
+        """
+        Devuelve las estadísticas de cada tramo sobre las duraciones conservadas.
+
+        :return: Lista de (nombre, {'count', 'total', 'p50', 'p95', 'p99', 'max'}) con los
+                 tiempos en ms, ordenada por nombre. 'total' cuenta también las ya descartadas.
+        """
+        with self._lock:
+            snapshot = {name: (sorted(durations), self._totals[name])
+                        for name, durations in self._durations.items()}
+        summary = []
+        for name in sorted(snapshot):
+            ordered, total = snapshot[name]
+            summary.append((name, {
+                'count': len(ordered),
+                'total': total,
+                'p50': percentile(ordered, 0.50) * 1000,
+                'p95': percentile(ordered, 0.95) * 1000,
+                'p99': percentile(ordered, 0.99) * 1000,
+                'max': ordered[-1] * 1000,
+            }))
+        return summary
+
+    def report(self):
+        """Devuelve las estadísticas como texto para el chat o la terminal."""
+        summary = self.summary()
+        if not summary:
+            return "Todavía no hay tiempos registrados. Haz alguna consulta y vuelve a escribir 'stats'."
+        width = max(len(name) for name, _ in summary)
+        lines = [f"Tiempos por tramo (últimas {self.buffer_size} muestras, en ms):",
+                 f"{'tramo'.ljust(width)}  {'n':>6}  {'p50':>8}  {'p95':>8}  {'p99':>8}  {'máx':>8}"]
+        for name, stats in summary:
+            lines.append(f"{name.ljust(width)}  {stats['total']:>6}  {stats['p50']:>8.2f}  "
+                         f"{stats['p95']:>8.2f}  {stats['p99']:>8.2f}  {stats['max']:>8.2f}")
+        return "\n".join(lines)
+
+
+# Registro compartido por el motor, las interfaces y el gestor de conexión
+recorder = SpanRecorder()
+
+
+def timed(name):
+    """Decorador que mide cada llamada a la función como un tramo del registro compartido."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with recorder.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
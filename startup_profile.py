@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Título: Medición del arranque de la interfaz (opción --profile-startup)
+
+"""
+Este módulo contiene el perfilador de arranque que se activa con:
+
+    python chat_app.py --profile-startup
+
+Registra, como hace 'python -X importtime', el tiempo acumulado y propio de cada
+módulo importado durante el arranque, y marca los hitos de la ventana: creación,
+primera pintura y motor listo (DuckDB y psutil se cargan después de pintar, ver
+chat_window.py). Al terminar imprime el informe, lo compara con el presupuesto de
+arranque y la aplicación se cierra; funciona igual desde el ejecutable de
+PyInstaller, donde -X importtime no está disponible.
+"""
+
+import builtins
+import sys
+import threading
+import time
+
+# Presupuesto de arranque (segundos desde que empieza el perfilado, al inicio de chat_app.py): primera pintura y motor listo
+FIRST_PAINT_BUDGET_SECONDS = 0.5
+ENGINE_READY_BUDGET_SECONDS = 1.5
+
+# Número de módulos más lentos que se listan en el informe
+REPORT_TOP_IMPORTS = 15
+
+# Hitos que terminan el perfilado: el motor se cargó o su carga falló
+FINAL_MARKS = ("motor listo", "motor fallido")
+
+
+class StartupProfiler:
+    """
+    Registra los hitos del arranque y el tiempo de importación de cada módulo.
+    """
+
+    def __init__(self, on_done=None):
+        """
+        :param on_done: Función que se llama al registrar el último hito (ver FINAL_MARKS).
+        """
+        self.started_at = time.perf_counter()
+        self.on_done = on_done
+        self.marks = []
+        # Por módulo: [tiempo acumulado, tiempo propio] en segundos
+        self.imports = {}
+        # Pila de importaciones en curso por hilo (el motor se importa en el pool de trabajos)
+        self._local = threading.local()
+        self._original_import = None
+
+    def install(self):
+        """Sustituye __import__ para medir las importaciones a partir de este momento."""
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        """Restaura el __import__ original."""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        """Mide las importaciones que cargan un módulo nuevo; las ya cargadas pasan sin coste."""
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.imports[name] = [elapsed, elapsed - nested]
+
+    def mark(self, label):
+        """Registra un hito con el tiempo transcurrido desde el inicio del perfilado."""
+        self.marks.append((label, time.perf_counter() - self.started_at))
+        if label in FINAL_MARKS and self.on_done is not None:
+            self.on_done()
+
+    def elapsed(self, label):
+        """Devuelve el tiempo del hito indicado, o None si no se ha alcanzado."""
+        for mark_label, seconds in self.marks:
+            if mark_label == label:
+                return seconds
+        return None
+
+    def watch_first_paint(self, widget, label="primera pintura"):
+        """Registra el hito 'label' cuando el widget recibe su primer evento de pintura."""
+        from PyQt6.QtCore import QEvent, QObject
+
+        profiler = self
+
+        class FirstPaintFilter(QObject):
+            def eventFilter(self, obj, event):
+                if event.type() == QEvent.Type.Paint:
+                    profiler.mark(label)
+                    obj.removeEventFilter(self)
+                return False
+
+        # Se guarda en el widget para que el filtro no se destruya antes de tiempo
+        widget._first_paint_filter = FirstPaintFilter(widget)
+        widget.installEventFilter(widget._first_paint_filter)
+
+    def report(self):
+        """Devuelve el informe de arranque como texto."""
+        lines = ["Hitos del arranque (segundos desde el inicio):"]
+        for label, seconds in self.marks:
+            lines.append(f"  {seconds * 1000:8.1f} ms  {label}")
+
+        lines.append("")
+        lines.append("Presupuesto:")
+        for label, budget in (("primera pintura", FIRST_PAINT_BUDGET_SECONDS),
+                              ("motor listo", ENGINE_READY_BUDGET_SECONDS)):
+            seconds = self.elapsed(label)
+            if seconds is None:
+                lines.append(f"  {label}: no alcanzado (presupuesto {budget * 1000:.0f} ms)")
+                continue
+            verdict = "OK" if seconds <= budget else "EXCEDIDO"
+            lines.append(f"  {label}: {seconds * 1000:.1f} ms de {budget * 1000:.0f} ms -> {verdict}")
+
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)[:REPORT_TOP_IMPORTS]
+        lines.append("")
+        lines.append("Importaciones más lentas (acumulado | propio, en ms):")
+        for name, (cumulative, own) in slowest:
+            lines.append(f"  {cumulative * 1000:8.1f} | {own * 1000:8.1f}  {name}")
+        return "\n".join(lines)
+
+    def within_budget(self):
+        """Indica si los hitos medidos caben en el presupuesto de arranque."""
+        first_paint = self.elapsed("primera pintura")
+        engine_ready = self.elapsed("motor listo")
+        return (first_paint is not None and first_paint <= FIRST_PAINT_BUDGET_SECONDS
+                and engine_ready is not None and engine_ready <= ENGINE_READY_BUDGET_SECONDS)